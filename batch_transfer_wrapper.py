@@ -1,19 +1,26 @@
 import argparse
+import contextlib
 import csv
+import functools
+import io
+import itertools
+import json
 import os
+import queue
+import re
 import shutil
+import stat
 import subprocess
 import sys
+import tempfile
+import threading
 import time
 import zipfile
+import zlib
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
-try:
-    from download_monitor import DownloadMonitor
-except Exception:
-    DownloadMonitor = None
-
 DEFAULT_CLEAR_PATH = r"C:\RA600\DATABASE\LOCAL\general"
 DEFAULT_BATCH_SIZE = 20
 DEFAULT_TRANSFER_ROOT = r"C:\FuTransfer"
@@ -21,11 +28,77 @@ DEFAULT_TRANSFER_PORT = None
 DEFAULT_TRANSFER_MODE = "zip"
 DEFAULT_TRANSFER_PROTOCOL = "http"
 DEFAULT_ZIP_ROOT = "transfer_zips"
+DEFAULT_ZIP_COMPRESSION = "stored"
+# --pipeline-zip staging folder under the zip root; kept out of zip cleanup
+# because batches that failed to zip are left there.
+ZIP_STAGING_DIR_NAME = ".staging"
+CSV_BUFFERING = 1024 * 1024
+# DICOM pixel data is usually already compressed, so STORED (or a fast
+# deflate level) avoids burning CPU for little size reduction. "auto" deflates
+# only files that do not look already compressed (see is_precompressed).
+ZIP_COMPRESSION_MODES = {
+    "auto": (zipfile.ZIP_DEFLATED, None),
+    "stored": (zipfile.ZIP_STORED, None),
+    "fast": (zipfile.ZIP_DEFLATED, 1),
+    "deflated": (zipfile.ZIP_DEFLATED, None),
+}
+ZIP_SNIFF_BYTES = 2048
+DICOM_TRANSFER_SYNTAX_TAG = b"\x02\x00\x10\x00UI"
+# JPEG family (1.2.840.10008.1.2.4.x), RLE and deflated explicit VR.
+COMPRESSED_TRANSFER_SYNTAX_PREFIX = b"1.2.840.10008.1.2.4."
+COMPRESSED_TRANSFER_SYNTAXES = (b"1.2.840.10008.1.2.5", b"1.2.840.10008.1.2.1.99")
+PRECOMPRESSED_MAGIC = (
+    b"\xff\xd8\xff",  # JPEG
+    b"\x00\x00\x00\x0cjP  ",  # JPEG 2000
+    b"\xffO\xffQ",  # JPEG 2000 codestream
+    b"\x89PNG",
+    b"PK\x03\x04",
+    b"\x1f\x8b",  # gzip
+)
+ZIP_WRITE_BUFFERING = 4 * 1024 * 1024
+ZIP_COPY_BUFFER_SIZE = 1024 * 1024
+ZIP_READ_WORKERS = min(8, os.cpu_count() or 1)
+ZIP_READ_AHEAD = 32
+# Raw bytes of read-ahead members in flight; deflated copies can add about
+# as much again before they are written.
+ZIP_READ_AHEAD_BYTES = 64 * 1024 * 1024
+ZIP_PREFETCH_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_ZIP_BACKEND = "python"
+ZIP_BACKENDS = ("auto", "python", "tar", "7z")
+# Command-line options per compression mode. bsdtar (tar.exe on Windows 10+)
+# only exposes store/deflate, so "fast" uses its default deflate level. The
+# tools cannot pick per file, so "auto" falls back to a plain deflate.
+EXTERNAL_ZIP_OPTIONS = {
+    "tar": {
+        "auto": ["--options", "zip:compression=deflate"],
+        "stored": ["--options", "zip:compression=store"],
+        "fast": ["--options", "zip:compression=deflate"],
+        "deflated": ["--options", "zip:compression=deflate"],
+    },
+    "7z": {
+        "auto": ["-mx=1"],
+        "stored": ["-mx=0"],
+        "fast": ["-mx=1"],
+        "deflated": ["-mx=5"],
+    },
+}
 DEFAULT_TMP_CLEANUP_HOURS = 24
 DEFAULT_ZIP_CLEANUP_HOURS = 0
 DEFAULT_CLEANUP_INTERVAL_MINUTES = 10
 DEFAULT_MONITOR_HOST = "0.0.0.0"
 DEFAULT_MONITOR_PORT = 8081
+# Must match dicom_downloader.SERVE_RESULT_PREFIX (--serve protocol lines).
+SERVE_RESULT_PREFIX = "@@serve "
+
+
+def load_download_monitor():
+    # Imported on demand: download_monitor pulls in asyncio, which is
+    # most of this script's import time and unused for --help/--no-monitor.
+    try:
+        from download_monitor import DownloadMonitor
+    except Exception:
+        return None
+    return DownloadMonitor
 
 
 def load_storage_path(config_path):
@@ -46,101 +119,176 @@ def load_storage_path(config_path):
     return None
 
 
-def normalize_key(key):
-    return "".join(str(key).split()).lower()
+# Every ASCII character str.split() treats as whitespace.
+_ASCII_WHITESPACE_TABLE = str.maketrans("", "", " \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f")
 
 
-def get_field(row, *candidates):
-    for candidate in candidates:
-        if not candidate:
-            continue
-        value = row.get(candidate)
-        if value is not None and str(value).strip():
-            return str(value).strip()
+@functools.lru_cache(maxsize=256)
+def normalize_key(key):
+    value = key if type(key) is str else str(key)
+    value = value.translate(_ASCII_WHITESPACE_TABLE)
+    if not value.isascii():
+        # Full-width and other Unicode spaces still go through split().
+        value = "".join(value.split())
+    return value.lower()
+
+
+def get_field(row, indices):
+    """Return the first non-empty value among the given column indices of a csv.reader row."""
+    width = len(row)
+    for index in indices:
+        if index < width:
+            value = row[index].strip()
+            if value:
+                return value
     return None
 
 
-def parse_case_list(csv_path):
-    tokens = (
-        "patientid",
-        "patient_id",
-        "studydate",
-        "study_date",
-        "date",
-        "modality",
-        "server",
-    )
+PATIENT_FIELDS = ("patientid", "patient_id", "patient", "id")
+DATE_FIELDS = ("studydate", "study_date", "date")
+MODALITY_FIELDS = ("modality",)
+SERVER_FIELDS = ("server",)
+
+
+def resolve_field_keys(column_index, aliases):
+    """Map normalized aliases to the column indices present in this CSV."""
+    return tuple(column_index[alias] for alias in aliases if alias in column_index)
+
+
+HEADER_TOKENS = (
+    "patientid",
+    "patient_id",
+    "studydate",
+    "study_date",
+    "date",
+    "modality",
+    "server",
+)
+HEADER_TOKEN_RE = re.compile("|".join(re.escape(token) for token in HEADER_TOKENS))
+
+
+def is_header_line(first_line):
+    header_line = normalize_key(first_line.lstrip("\ufeff"))
+    return HEADER_TOKEN_RE.search(header_line) is not None
 
-    with open(csv_path, "r", newline="", encoding="utf-8") as handle:
+
+def estimate_case_count(csv_path):
+    """Cheap prepass: count non-blank, non-comment data lines without parsing CSV."""
+    count = 0
+    with open(csv_path, "rb", buffering=CSV_BUFFERING) as handle:
         first_line = handle.readline()
-        handle.seek(0)
-        header_line = normalize_key(first_line.lstrip("\ufeff"))
-        has_header = any(token in header_line for token in tokens)
+        if first_line and not is_header_line(first_line.decode("utf-8", "replace")):
+            handle.seek(0)
+        for line in handle:
+            stripped = line.strip()
+            if stripped and not stripped.startswith(b"#"):
+                count += 1
+    return count
+
+
+def _iter_header_rows(reader, column_index, stats):
+    # Header names are constant for the whole file; resolve them once.
+    patient_keys = resolve_field_keys(column_index, PATIENT_FIELDS)
+    date_keys = resolve_field_keys(column_index, DATE_FIELDS)
+    modality_keys = resolve_field_keys(column_index, MODALITY_FIELDS)
+    server_keys = resolve_field_keys(column_index, SERVER_FIELDS)
+
+    for row in reader:
+        if not row:
+            continue
+        patient_id = get_field(row, patient_keys)
+        if patient_id and patient_id.startswith("#"):
+            continue
 
-        if has_header:
-            reader = csv.DictReader(handle)
-            fieldnames = reader.fieldnames or []
-            normalized_fields = {}
-            for field in fieldnames:
-                if field is None:
-                    continue
-                normalized_fields[normalize_key(field)] = field
+        if not (
+            patient_id
+            and get_field(row, date_keys)
+            and get_field(row, modality_keys)
+            and get_field(row, server_keys)
+        ):
+            stats["skipped"] += 1
+            continue
 
-            rows = []
-            skipped = 0
-            for row in reader:
-                if not row:
-                    continue
-                raw_patient = get_field(
-                    row,
-                    normalized_fields.get("patientid"),
-                    normalized_fields.get("patient_id"),
-                    normalized_fields.get("patient"),
-                    normalized_fields.get("id"),
-                )
-                if raw_patient and raw_patient.startswith("#"):
-                    continue
+        yield row
 
-                patient_id = raw_patient
-                study_date = get_field(
-                    row,
-                    normalized_fields.get("studydate"),
-                    normalized_fields.get("study_date"),
-                    normalized_fields.get("date"),
-                )
-                modality = get_field(row, normalized_fields.get("modality"))
-                server = get_field(row, normalized_fields.get("server"))
 
-                if not all([patient_id, study_date, modality, server]):
-                    skipped += 1
-                    continue
+def _iter_plain_rows(reader, stats):
+    for row in reader:
+        if not row or str(row[0]).strip().startswith("#"):
+            continue
+        if len(row) < 4:
+            stats["skipped"] += 1
+            continue
+        yield row
 
-                rows.append(row)
 
-            return {
-                "has_header": True,
-                "fieldnames": fieldnames,
-                "rows": rows,
-                "skipped": skipped,
-            }
+def chunk_rows(rows, batch_size):
+    """Yield (batch_index, chunk) lists of up to batch_size items from any iterable."""
+    iterator = iter(rows)
+    batch_index = 0
+    while True:
+        chunk = list(itertools.islice(iterator, batch_size))
+        if not chunk:
+            return
+        batch_index += 1
+        yield batch_index, chunk
+
+
+def _iter_open_rows(handle, rows):
+    try:
+        yield from rows
+    finally:
+        handle.close()
 
-        reader = csv.reader(handle, skipinitialspace=True)
-        rows = []
-        skipped = 0
-        for row in reader:
-            if not row or str(row[0]).strip().startswith("#"):
-                continue
-            if len(row) < 4:
-                skipped += 1
-                continue
-            rows.append(row)
 
-        return {
-            "has_header": False,
-            "fieldnames": None,
-            "rows": rows,
-            "skipped": skipped,
-        }
+def open_case_list(csv_path, meta=None):
+    """Open csv_path and sniff its header; return (meta, row_iter).
+
+    meta holds "has_header", "fieldnames" and a live "skipped" counter that
+    row_iter increments for invalid rows. row_iter owns the file handle and
+    closes it when exhausted or closed.
+    """
+    if meta is None:
+        meta = {}
+    meta.setdefault("skipped", 0)
+
+    handle = open(csv_path, "r", newline="", encoding="utf-8", buffering=CSV_BUFFERING)
+    try:
+        # Sniff the header from the first line and keep reading from there;
+        # no seek(0) and no second decode of the buffered start of the file.
+        # Each mode keeps its own dialect: header files parse as DictReader
+        # did, headerless ones with skipinitialspace.
+        first_line = handle.readline().lstrip("\ufeff")
+        has_header = is_header_line(first_line)
+
+        if has_header:
+            fieldnames = next(csv.reader([first_line]), [])
+            # Later duplicates win, as they would in a DictReader row.
+            column_index = {normalize_key(field): index for index, field in enumerate(fieldnames)}
+            rows = _iter_header_rows(csv.reader(handle), column_index, meta)
+        else:
+            fieldnames = None
+            reader = csv.reader(itertools.chain([first_line], handle), skipinitialspace=True)
+            rows = _iter_plain_rows(reader, meta)
+    except BaseException:
+        handle.close()
+        raise
+
+    meta["has_header"] = has_header
+    meta["fieldnames"] = fieldnames
+    return meta, _iter_open_rows(handle, rows)
+
+
+def iter_case_batches(csv_path, batch_size, stats=None):
+    """Stream validated rows from csv_path as (batch_index, has_header, fieldnames, chunk).
+
+    Only one batch is held in memory at a time. Invalid rows are counted in
+    stats["skipped"] when a stats dict is given.
+    """
+    meta, rows = open_case_list(csv_path, stats)
+    with contextlib.closing(rows):
+        for batch_index, chunk in chunk_rows(rows, batch_size):
+            yield batch_index, meta["has_header"], meta["fieldnames"], chunk
 
 
 def is_drive_root(path):
@@ -151,6 +299,142 @@ def is_drive_root(path):
     return resolved == Path("/")
 
 
+def remove_file(path):
+    try:
+        os.unlink(path)
+    except PermissionError:
+        # Read-only files (common for PACS exports on Windows) need write access first.
+        os.chmod(path, 0o700)
+        os.unlink(path)
+
+
+def is_link_like(entry):
+    if entry.is_symlink():
+        return True
+    if os.name == "nt":
+        # Junctions are not symlinks but must not be descended into either.
+        attributes = entry.stat(follow_symlinks=False).st_file_attributes
+        return bool(attributes & stat.FILE_ATTRIBUTE_REPARSE_POINT)
+    return False
+
+
+# os.fwalk (POSIX only) hands out directory fds so unlink/rmdir can resolve
+# names relative to them instead of re-walking every path from the root.
+FD_WALK_AVAILABLE = hasattr(os, "fwalk") and os.unlink in os.supports_dir_fd
+
+
+def _raise_walk_error(exc):
+    raise exc
+
+
+def _fast_rmtree_fd(path):
+    for _, dirnames, filenames, dir_fd in os.fwalk(path, topdown=False, onerror=_raise_walk_error):
+        for name in filenames:
+            os.unlink(name, dir_fd=dir_fd)
+        for name in dirnames:
+            try:
+                os.rmdir(name, dir_fd=dir_fd)
+            except NotADirectoryError:
+                # fwalk lists symlinks to directories as dirnames without following them.
+                os.unlink(name, dir_fd=dir_fd)
+    os.rmdir(path)
+
+
+def fast_rmtree(path):
+    """Remove a directory tree with an os.scandir stack.
+
+    DirEntry.is_dir() answers from the directory listing itself, so unlike
+    shutil.rmtree no extra lstat is issued per entry. Directories are removed
+    post-order once their contents are gone; links are removed, never followed.
+    """
+    path = os.fspath(path)
+    if os.path.islink(path):
+        raise OSError(f"Cannot remove tree through a symbolic link: {path}")
+    if FD_WALK_AVAILABLE:
+        _fast_rmtree_fd(path)
+        return
+    stack = [(path, False)]
+    while stack:
+        current, emptied = stack.pop()
+        if emptied:
+            os.rmdir(current)
+            continue
+        stack.append((current, True))
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and not is_link_like(entry):
+                    stack.append((entry.path, False))
+                elif entry.is_dir(follow_symlinks=False):
+                    os.rmdir(entry.path)
+                else:
+                    remove_file(entry.path)
+
+
+def move_storage_contents(storage_path, staging_dir):
+    """Rename the top-level entries of storage_path into staging_dir.
+
+    Renames are metadata-only on the same drive, so this empties the storage
+    folder almost instantly. On failure (e.g. staging_dir is on another drive)
+    anything already moved is put back and False is returned. The same
+    guards as clear_directory_contents apply, since staged data is deleted.
+    """
+    if not Path(storage_path).exists():
+        print(f"[stage] Skip missing path: {storage_path}")
+        return False
+    if is_drive_root(storage_path):
+        print(f"[stage] Refusing to stage drive root: {storage_path}")
+        return False
+    storage_str = str(storage_path)
+    staging_str = str(staging_dir)
+    moved = []
+    try:
+        os.makedirs(staging_str, exist_ok=True)
+        with os.scandir(storage_str) as entries:
+            names = [entry.name for entry in entries]
+        for name in names:
+            os.rename(os.path.join(storage_str, name), os.path.join(staging_str, name))
+            moved.append(name)
+    except OSError as exc:
+        print(f"[stage] Could not move {storage_str} to {staging_str}: {exc}")
+        for name in reversed(moved):
+            try:
+                os.rename(os.path.join(staging_str, name), os.path.join(storage_str, name))
+            except OSError:
+                pass
+        try:
+            os.rmdir(staging_str)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+# cmd.exe caps a command line at 8191 characters; names with characters cmd
+# may still interpret inside quotes are left to the Python removal path.
+RD_COMMAND_LIMIT = 8000
+RD_UNSAFE_CHARS = frozenset('%!"^&')
+
+
+def remove_trees_with_rd(paths):
+    """Windows: delete whole trees natively with rd /s /q, several per cmd.exe launch.
+
+    Errors are not reported here; callers re-check what is left and fall
+    back to fast_rmtree for it.
+    """
+    batch = []
+    length = 0
+    for path in paths:
+        command = f'rd /s /q "{path}"'
+        if batch and length + len(command) > RD_COMMAND_LIMIT:
+            subprocess.run(" & ".join(batch), shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            batch = []
+            length = 0
+        batch.append(command)
+        length += len(command) + 3
+    if batch:
+        subprocess.run(" & ".join(batch), shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
 def clear_directory_contents(path, dry_run=False):
     target = Path(path)
     if not target.exists():
@@ -160,19 +444,34 @@ def clear_directory_contents(path, dry_run=False):
         print(f"[clear] Refusing to clear drive root: {target}")
         return False
 
+    with os.scandir(target) as scan:
+        entries = list(scan)
+    if os.name == "nt" and not dry_run:
+        tree_paths = [
+            entry.path
+            for entry in entries
+            if entry.is_dir(follow_symlinks=False)
+            and not is_link_like(entry)
+            and RD_UNSAFE_CHARS.isdisjoint(entry.path)
+        ]
+        if tree_paths:
+            remove_trees_with_rd(tree_paths)
+
     ok = True
-    for entry in target.iterdir():
+    for entry in entries:
         try:
             if dry_run:
-                print(f"[clear] {entry}")
+                print(f"[clear] {entry.path}")
+                continue
+            if not os.path.lexists(entry.path):
                 continue
             if entry.is_dir():
-                shutil.rmtree(entry)
+                fast_rmtree(entry.path)
             else:
-                entry.unlink()
+                remove_file(entry.path)
         except Exception as exc:
             ok = False
-            print(f"[clear] Failed to remove {entry}: {exc}")
+            print(f"[clear] Failed to remove {entry.path}: {exc}")
     return ok
 
 
@@ -184,14 +483,22 @@ def has_any_files(path, dry_run=False):
     if not target.exists():
         print(f"[transfer] Missing source path: {target}")
         return False
-    for root, _, filenames in os.walk(target):
-        if filenames:
-            return True
+    stack = [str(target)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        return True
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError:
+            continue
     print(f"[transfer] No files found under {target}")
     return False
 
 
-def cleanup_old_entries(root, max_age_seconds, dry_run=False, label=None):
+def cleanup_old_entries(root, max_age_seconds, dry_run=False, label=None, keep_names=()):
     target = Path(root)
     if not target.exists():
         return 0
@@ -199,25 +506,32 @@ def cleanup_old_entries(root, max_age_seconds, dry_run=False, label=None):
     now = time.time()
     removed = 0
 
-    for entry in target.iterdir():
-        try:
-            age_seconds = now - entry.stat().st_mtime
-        except OSError:
-            continue
-        if age_seconds < max_age_seconds:
-            continue
-        if dry_run:
-            print(f"[cleanup] {entry}")
-            removed += 1
-            continue
-        try:
-            if entry.is_dir():
-                shutil.rmtree(entry)
-            else:
-                entry.unlink()
-            removed += 1
-        except Exception as exc:
-            print(f"[cleanup] Failed to remove {entry}: {exc}")
+    # DirEntry.stat() and is_dir() reuse the directory listing data (free on
+    # Windows), so each entry costs no extra stat call.
+    with os.scandir(target) as entries:
+        for entry in entries:
+            if entry.name in keep_names:
+                continue
+            try:
+                age_seconds = now - entry.stat(follow_symlinks=False).st_mtime
+            except OSError:
+                continue
+            if age_seconds < max_age_seconds:
+                continue
+            if dry_run:
+                print(f"[cleanup] {entry.path}")
+                removed += 1
+                continue
+            try:
+                if not entry.is_dir(follow_symlinks=False):
+                    remove_file(entry.path)
+                elif is_link_like(entry):
+                    os.rmdir(entry.path)
+                else:
+                    fast_rmtree(entry.path)
+                removed += 1
+            except Exception as exc:
+                print(f"[cleanup] Failed to remove {entry.path}: {exc}")
 
     if removed:
         label = label or str(target)
@@ -237,30 +551,60 @@ def maybe_run_cleanup(last_cleanup, interval_seconds, tmp_root, zip_root, tmp_tt
     if tmp_ttl > 0:
         cleanup_old_entries(tmp_root, tmp_ttl, dry_run=dry_run, label="batch_tmp")
     if zip_ttl > 0:
-        cleanup_old_entries(zip_root, zip_ttl, dry_run=dry_run, label="transfer_zips")
+        cleanup_old_entries(
+            zip_root, zip_ttl, dry_run=dry_run, label="transfer_zips", keep_names=(ZIP_STAGING_DIR_NAME,)
+        )
 
     return now
 
 
+@functools.lru_cache(maxsize=4096)
+def dedupe_key(path_str):
+    # Pure string normalization: no symlink resolution or stat like Path.resolve().
+    return os.path.normcase(os.path.abspath(path_str))
+
+
+def scan_csv_paths(root, recursive=False):
+    found = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(".csv") and entry.is_file():
+                        found.append(entry.path)
+        except OSError:
+            continue
+    found.sort()
+    return found
+
+
 def collect_csvs(inputs, recursive=False):
     csv_files = []
     errors = []
     seen = set()
 
     for raw in inputs:
-        path = Path(raw)
-        if path.is_dir():
-            pattern = "**/*.csv" if recursive else "*.csv"
-            for csv_path in sorted(path.glob(pattern)):
-                if csv_path.is_file():
-                    resolved = str(csv_path.resolve())
-                    if resolved not in seen:
-                        csv_files.append(csv_path)
-                        seen.add(resolved)
-        elif path.is_file() and path.suffix.lower() == ".csv":
-            resolved = str(path.resolve())
+        # One stat per input decides dir vs file; paths stay strings until
+        # they are returned.
+        try:
+            mode = os.stat(raw).st_mode
+        except (OSError, ValueError):
+            mode = 0
+        if stat.S_ISDIR(mode):
+            for csv_path in scan_csv_paths(raw, recursive=recursive):
+                resolved = dedupe_key(csv_path)
+                if resolved not in seen:
+                    csv_files.append(Path(csv_path))
+                    seen.add(resolved)
+        elif stat.S_ISREG(mode) and raw.lower().endswith(".csv"):
+            resolved = dedupe_key(raw)
             if resolved not in seen:
-                csv_files.append(path)
+                csv_files.append(Path(raw))
                 seen.add(resolved)
         else:
             errors.append(raw)
@@ -276,37 +620,38 @@ def resolve_path(path_value, script_dir):
 
 
 def resolve_transfer_root(preferred_root, script_dir):
-    preferred = Path(preferred_root)
-    if preferred.exists():
-        return preferred
-    sibling = Path(script_dir).parent / "FuTransfer"
-    if sibling.exists():
-        return sibling
-    return preferred
+    if os.path.isdir(preferred_root):
+        return Path(preferred_root)
+    sibling = os.path.join(os.path.dirname(os.fspath(script_dir)), "FuTransfer")
+    if os.path.isdir(sibling):
+        return Path(sibling)
+    return Path(preferred_root)
 
 
 def extract_config_path(download_args, script_dir):
     if not download_args:
         return None
 
-    for idx, arg in enumerate(download_args):
-        if arg == "--config" and idx + 1 < len(download_args):
-            return Path(download_args[idx + 1])
-        if arg.startswith("--config="):
-            return Path(arg.split("=", 1)[1])
+    expect_value = False
+    for arg in download_args:
+        if expect_value:
+            return Path(arg)
+        if arg == "--config":
+            expect_value = True
+        elif arg.startswith("--config="):
+            return Path(arg[len("--config="):])
 
     return None
 
 
-def build_transfer_args(args, folder):
+def build_transfer_args_base(args):
+    """Client arguments shared by every batch; each batch appends "--folder <dir>"."""
     if not args.transfer_server:
         return None, "Missing --transfer-server (or set FUTRANSFER_SERVER)."
 
     transfer_args = [
         "--server",
         args.transfer_server,
-        "--folder",
-        str(folder),
     ]
 
     if args.transfer_protocol == "http":
@@ -331,51 +676,509 @@ def build_transfer_args(args, folder):
     return transfer_args, None
 
 
+# O_SHORT_LIVED (Windows only) sets FILE_ATTRIBUTE_TEMPORARY, asking the cache
+# manager not to flush the file to disk while it is still open or soon deleted.
+_SHORT_LIVED_FLAG = getattr(os, "O_SHORT_LIVED", 0)
+
+
+def _short_lived_opener(path, flags):
+    return os.open(path, flags | _SHORT_LIVED_FLAG)
+
+
 def write_chunk_csv(path, chunk, has_header, fieldnames):
-    with open(path, "w", newline="", encoding="utf-8") as handle:
-        if has_header:
-            writer = csv.DictWriter(handle, fieldnames=fieldnames, extrasaction="ignore")
-            writer.writeheader()
-            for row in chunk:
-                writer.writerow(row)
-        else:
-            writer = csv.writer(handle)
-            writer.writerows(chunk)
+    """Render the batch in memory and write it to disk in one call."""
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer)
+    if has_header:
+        # Pad or trim ragged rows to the header width so columns stay aligned.
+        width = len(fieldnames)
+        writer.writerow(fieldnames)
+        writer.writerows(
+            row if len(row) == width else (row + [""] * width)[:width]
+            for row in chunk
+        )
+    else:
+        writer.writerows(chunk)
+    with open(path, "wb", opener=_short_lived_opener) as handle:
+        handle.write(buffer.getvalue().encode("utf-8"))
+
+
+def zip_info_from_stat(arcname, st):
+    """ZipInfo.from_file without its extra stat: reuse the walk's DirEntry.stat()."""
+    zinfo = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[:6])
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    return zinfo
+
+
+# ZipFile.open(zinfo, "w") takes the deflate level from the ZipInfo: public as
+# compress_level since Python 3.13, _compresslevel before. None if neither
+# exists, in which case leveled entries go through ZipFile.write instead.
+_ZINFO_LEVEL_ATTR = next(
+    (name for name in ("compress_level", "_compresslevel") if hasattr(zipfile.ZipInfo(), name)),
+    None,
+)
+
+
+def write_zip_entry(zip_handle, full_path, zinfo, compress_type, compress_level, copy_buffer):
+    """Copy one file into the archive through a reusable buffer (ZipFile.write uses 8 KiB reads)."""
+    if compress_level is not None and _ZINFO_LEVEL_ATTR is None:
+        zip_handle.write(full_path, zinfo.filename, compress_type, compress_level)
+        return
+    zinfo.compress_type = compress_type
+    if _ZINFO_LEVEL_ATTR is not None:
+        setattr(zinfo, _ZINFO_LEVEL_ATTR, compress_level)
+    view = memoryview(copy_buffer)
+    with open(full_path, "rb", buffering=0) as source, zip_handle.open(zinfo, "w") as target:
+        while True:
+            read = source.readinto(copy_buffer)
+            if not read:
+                break
+            target.write(view[:read])
+
+
+def iter_storage_files(storage_str):
+    stack = [storage_str]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    # On Windows this stat comes from the directory listing itself.
+                    yield entry.path, entry.stat()
+
+
+def is_precompressed(data):
+    """Guess from the leading bytes whether deflating the file is wasted work."""
+    if data[128:132] == b"DICM":
+        pos = data.find(DICOM_TRANSFER_SYNTAX_TAG, 132, ZIP_SNIFF_BYTES)
+        if pos == -1:
+            return False
+        length = int.from_bytes(data[pos + 6:pos + 8], "little")
+        uid = data[pos + 8:pos + 8 + length].rstrip(b"\x00 ")
+        return uid.startswith(COMPRESSED_TRANSFER_SYNTAX_PREFIX) or uid in COMPRESSED_TRANSFER_SYNTAXES
+    return data.startswith(PRECOMPRESSED_MAGIC)
+
+
+def sniff_file_head(full_path):
+    with open(full_path, "rb") as source:
+        return source.read(ZIP_SNIFF_BYTES)
+
+
+def read_zip_member(full_path, zinfo, compress_type, compress_level, auto_detect):
+    """Read one file and do its CRC and deflate on the calling worker thread.
+
+    zlib releases the GIL for both, so the read-ahead threads compress in
+    parallel and the writer thread only appends finished bytes. Without raw
+    member support the file data is returned as-is for ZipFile.writestr.
+    """
+    with open(full_path, "rb") as source:
+        data = source.read()
+    if auto_detect and is_precompressed(data):
+        compress_type = zipfile.ZIP_STORED
+    if not RAW_ZIP_MEMBERS:
+        zinfo.compress_type = compress_type
+        return zinfo, data
+    if compress_type == zipfile.ZIP_DEFLATED:
+        level = zlib.Z_DEFAULT_COMPRESSION if compress_level is None else compress_level
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        payload = compressor.compress(data) + compressor.flush()
+    else:
+        payload = data
+    zinfo.compress_type = compress_type
+    zinfo.CRC = zlib.crc32(data)
+    zinfo.file_size = len(data)
+    zinfo.compress_size = len(payload)
+    return zinfo, payload
+
+
+def write_raw_member(zip_handle, zinfo, payload):
+    """Append an already-compressed member, mirroring ZipFile.writestr's bookkeeping.
+
+    Relies on ZipFile internals; only used when RAW_ZIP_MEMBERS is true.
+    """
+    with zip_handle._lock:
+        fp = zip_handle.fp
+        fp.seek(zip_handle.start_dir)
+        zinfo.header_offset = fp.tell()
+        zip_handle._writecheck(zinfo)
+        zip_handle._didModify = True
+        fp.write(zinfo.FileHeader())
+        fp.write(payload)
+        zip_handle.filelist.append(zinfo)
+        zip_handle.NameToInfo[zinfo.filename] = zinfo
+        zip_handle.start_dir = fp.tell()
+
+
+def _raw_zip_members_work():
+    """Round-trip a stored and a deflated member through write_raw_member."""
+    data = b"raw member check " * 64
+    try:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", allowZip64=True) as zip_handle:
+            for name, compress_type in (("s", zipfile.ZIP_STORED), ("d", zipfile.ZIP_DEFLATED)):
+                payload = data
+                if compress_type == zipfile.ZIP_DEFLATED:
+                    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                    payload = compressor.compress(data) + compressor.flush()
+                zinfo = zipfile.ZipInfo(name, (2000, 1, 1, 0, 0, 0))
+                zinfo.compress_type = compress_type
+                zinfo.CRC = zlib.crc32(data)
+                zinfo.file_size = len(data)
+                zinfo.compress_size = len(payload)
+                write_raw_member(zip_handle, zinfo, payload)
+        with zipfile.ZipFile(buffer) as check:
+            return check.testzip() is None and check.read("s") == data and check.read("d") == data
+    except Exception:
+        return False
+
+
+# Whether members deflated on the read-ahead threads can be appended as-is;
+# if ZipFile's internals ever change, zip_storage_contents uses writestr.
+RAW_ZIP_MEMBERS = _raw_zip_members_work()
+
+
+def find_zip_tool(name):
+    if name == "tar":
+        if os.name == "nt":
+            # Prefer the bundled bsdtar over GNU tar (e.g. from Git), which cannot write zip.
+            system_tar = os.path.join(os.environ.get("SystemRoot", r"C:\Windows"), "System32", "tar.exe")
+            if os.path.isfile(system_tar):
+                return system_tar
+            return None
+        return shutil.which("bsdtar")
+    if name == "7z":
+        found = shutil.which("7z")
+        if found or os.name != "nt":
+            return found
+        for base in (os.environ.get("ProgramFiles"), os.environ.get("ProgramFiles(x86)")):
+            if base:
+                candidate = os.path.join(base, "7-Zip", "7z.exe")
+                if os.path.isfile(candidate):
+                    return candidate
+    return None
 
 
-def zip_storage_contents(storage_path, zip_path, dry_run=False):
+def resolve_zip_backend(requested):
+    """Return (backend, executable); executable is None for the built-in zipfile writer."""
+    if requested == "python":
+        return "python", None
+    if requested == "auto":
+        executable = find_zip_tool("tar") if os.name == "nt" else None
+        return ("tar", executable) if executable else ("python", None)
+    executable = find_zip_tool(requested)
+    if not executable:
+        print(f"[zip] {requested} not found; using the built-in zip writer.")
+        return "python", None
+    return requested, executable
+
+
+def zip_with_tool(backend, executable, storage_str, zip_path, compression):
+    options = EXTERNAL_ZIP_OPTIONS[backend][compression]
+    if backend == "tar":
+        # Strip the "./" prefix (and drop the "." entry) so member names match
+        # the built-in writer; tar and 7z still add entries for subfolders.
+        cmd = [
+            executable, "-a", "-cf", str(zip_path), *options,
+            "-s", r",^\./,,", "-s", r",^\.$,,", "-C", storage_str, ".",
+        ]
+    else:
+        cmd = [executable, "a", "-tzip", "-mmt=on", "-bd", *options, str(zip_path), "*"]
+    try:
+        completed = subprocess.run(cmd, cwd=storage_str, stdout=subprocess.DEVNULL)
+    except OSError as exc:
+        print(f"[zip] Failed to run {backend}: {exc}")
+        return False
+    if completed.returncode != 0:
+        print(f"[zip] {backend} exited with code {completed.returncode}")
+        return False
+    return True
+
+
+def zip_storage_contents(
+    storage_path,
+    zip_path,
+    dry_run=False,
+    compression=DEFAULT_ZIP_COMPRESSION,
+    backend=("python", None),
+):
     storage = Path(storage_path)
+    backend_name, backend_exe = backend
     if dry_run:
-        print(f"[zip] {storage} -> {zip_path} (dry-run)")
+        print(f"[zip] {storage} -> {zip_path} (dry-run, {compression}, backend={backend_name})")
         return True
 
     if not storage.exists():
         print(f"[zip] Missing storage path: {storage}")
         return False
 
-    files = []
-    for root, _, filenames in os.walk(storage):
-        for filename in filenames:
-            file_path = Path(root) / filename
-            rel_path = file_path.relative_to(storage)
-            files.append((file_path, rel_path))
-
-    if not files:
+    storage_str = str(storage)
+    zip_path.parent.mkdir(parents=True, exist_ok=True)
+    if backend_exe:
+        if next(iter_storage_files(storage_str), None) is None:
+            print(f"[zip] No files found under {storage}")
+            try:
+                zip_path.parent.rmdir()
+            except OSError:
+                pass
+            return False
+        if zip_with_tool(backend_name, backend_exe, storage_str, zip_path, compression):
+            return True
+        print("[zip] Falling back to the built-in zip writer.")
+        try:
+            zip_path.unlink()
+        except OSError:
+            pass
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    wrote_any = False
+    # scandir paths are os.path.join(storage_str, ...), so slicing off the
+    # joined prefix gives the relative name without os.path.relpath's work.
+    prefix_len = len(os.path.join(storage_str, ""))
+    needs_slash_fix = os.sep != "/"
+    compress_type, compress_level = ZIP_COMPRESSION_MODES[compression]
+    auto_detect = compression == "auto"
+    copy_buffer = bytearray(ZIP_COPY_BUFFER_SIZE)
+    with open(zip_path, "wb", buffering=ZIP_WRITE_BUFFERING) as zip_file:
+        with zipfile.ZipFile(
+            zip_file,
+            "w",
+            compression=compress_type,
+            compresslevel=compress_level,
+            allowZip64=True,
+        ) as zip_handle:
+            # Worker threads read (and deflate) files ahead while this thread
+            # stays the only ZipFile writer. At most ZIP_READ_AHEAD members
+            # and ZIP_READ_AHEAD_BYTES of file data are in flight; larger
+            # files are streamed by write_zip_entry instead.
+            pending = deque()
+            pending_bytes = 0
+
+            def member_compression(head):
+                if auto_detect and is_precompressed(head):
+                    return zipfile.ZIP_STORED, None
+                return compress_type, compress_level
+
+            def write_oldest():
+                nonlocal pending_bytes
+                future, size = pending.popleft()
+                pending_bytes -= size
+                zinfo, payload = future.result()
+                if RAW_ZIP_MEMBERS:
+                    write_raw_member(zip_handle, zinfo, payload)
+                else:
+                    level = compress_level if zinfo.compress_type == zipfile.ZIP_DEFLATED else None
+                    zip_handle.writestr(zinfo, payload, compresslevel=level)
+
+            with ThreadPoolExecutor(max_workers=ZIP_READ_WORKERS) as executor:
+                for full_path, st in iter_storage_files(storage_str):
+                    arcname = full_path[prefix_len:]
+                    if needs_slash_fix:
+                        arcname = arcname.replace(os.sep, "/")
+                    zinfo = zip_info_from_stat(arcname, st)
+                    wrote_any = True
+                    if st.st_size > ZIP_PREFETCH_MAX_BYTES:
+                        member_type, member_level = member_compression(
+                            sniff_file_head(full_path) if auto_detect else b""
+                        )
+                        write_zip_entry(
+                            zip_handle,
+                            full_path,
+                            zinfo,
+                            member_type,
+                            member_level,
+                            copy_buffer,
+                        )
+                        continue
+                    while pending and (
+                        len(pending) >= ZIP_READ_AHEAD or pending_bytes + st.st_size > ZIP_READ_AHEAD_BYTES
+                    ):
+                        write_oldest()
+                    pending.append((
+                        executor.submit(
+                            read_zip_member,
+                            full_path,
+                            zinfo,
+                            compress_type,
+                            compress_level,
+                            auto_detect,
+                        ),
+                        st.st_size,
+                    ))
+                    pending_bytes += st.st_size
+                while pending:
+                    write_oldest()
+
+    if not wrote_any:
         print(f"[zip] No files found under {storage}")
+        try:
+            zip_path.unlink()
+            zip_path.parent.rmdir()
+        except OSError:
+            pass
         return False
 
-    zip_path.parent.mkdir(parents=True, exist_ok=True)
-    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zip_handle:
-        for file_path, rel_path in files:
-            zip_handle.write(file_path, rel_path.as_posix())
-
     return True
 
 
-def chunk_rows(rows, batch_size):
-    for start in range(0, len(rows), batch_size):
-        batch_index = start // batch_size + 1
-        yield batch_index, rows[start : start + batch_size]
+class BatchJob:
+    """Everything the transfer stage needs to finish one downloaded batch."""
+
+    def __init__(self, batch_label, case_count, temp_csv):
+        self.batch_label = batch_label
+        self.case_count = case_count
+        self.temp_csv = temp_csv
+        self.transfer_source = None
+        self.batch_dir = None
+        self.zip_path = None
+        self.staging_dir = None
+
+
+class RunState:
+    """Error and progress counters shared by the download loop and the transfer worker."""
+
+    def __init__(self, monitor, stop_on_error):
+        self.lock = threading.Lock()
+        self.monitor = monitor
+        self.stop_on_error = stop_on_error
+        self.ok = True
+        self.stopped = False
+        self.errors = 0
+        self.cases_done = 0
+        self.batches_done = 0
+
+    def fail(self, phase, message, level="ERROR"):
+        """Record a failed step; returns True when the run should stop."""
+        with self.lock:
+            self.ok = False
+            self.errors += 1
+            errors = self.errors
+            if self.stop_on_error:
+                self.stopped = True
+        if self.monitor:
+            self.monitor.update(errors=errors, phase=phase)
+            self.monitor.log_event(message, level)
+        return self.stop_on_error
+
+    def batch_done(self, case_count):
+        with self.lock:
+            self.cases_done += case_count
+            self.batches_done += 1
+            cases_done = self.cases_done
+            batches_done = self.batches_done
+        if self.monitor:
+            self.monitor.update(cases_done=cases_done, batches_done=batches_done)
+
+
+class TransferWorker:
+    """Background thread that runs queued batch jobs (transfer or zip) one at a time."""
+
+    def __init__(self, handler, state, label="transfer"):
+        self.handler = handler
+        self.state = state
+        self.label = label
+        self.jobs = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        self.jobs.put(job)
+
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            if self.state.stopped:
+                continue
+            try:
+                self.handler(job)
+            except Exception as exc:
+                print(f"[{self.label}] Worker failed on batch {job.batch_label}: {exc}")
+                self.state.fail(f"{self.label}_error", f"{self.label.capitalize()} worker failed: {exc}")
+
+
+class DownloadServer:
+    """One long-lived `dicom_downloader.py --serve` process shared by every batch.
+
+    Saves the interpreter start and pynetdicom/pydicom import per batch. The
+    child's stdout is passed through except for SERVE_RESULT_PREFIX lines.
+    """
+
+    def __init__(self, cmd, cwd):
+        self.cmd = cmd
+        self.cwd = cwd
+        self.process = None
+
+    def start(self):
+        print(f"[run] {self.cmd}")
+        try:
+            self.process = subprocess.Popen(
+                self.cmd,
+                cwd=self.cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                bufsize=1,
+            )
+        except OSError as exc:
+            print(f"[download] Could not start worker process: {exc}")
+            return False
+        if self._read_result() is None:
+            self.close()
+            return False
+        return True
+
+    @property
+    def running(self):
+        return self.process is not None
+
+    def _read_result(self):
+        for line in self.process.stdout:
+            if line.startswith(SERVE_RESULT_PREFIX):
+                try:
+                    return json.loads(line[len(SERVE_RESULT_PREFIX):])
+                except ValueError:
+                    return None
+            sys.stdout.write(line)
+        return None
+
+    def run_batch(self, csv_path):
+        print(f"[serve] --batch {csv_path}")
+        try:
+            self.process.stdin.write(json.dumps({"batch": csv_path}) + "\n")
+            self.process.stdin.flush()
+            result = self._read_result()
+        except OSError:
+            result = None
+        if result is None:
+            print("[download] Worker process exited; later batches start their own process.")
+            return self.close() or 1
+        return result.get("rc", 1)
+
+    def close(self):
+        """Stop the child after draining its output; returns its exit code."""
+        if self.process is None:
+            return None
+        process = self.process
+        self.process = None
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        for line in process.stdout:
+            if not line.startswith(SERVE_RESULT_PREFIX):
+                sys.stdout.write(line)
+        process.stdout.close()
+        return process.wait()
 
 
 def run_cmd(cmd, cwd, dry_run=False):
@@ -471,6 +1274,24 @@ def main():
         default=DEFAULT_ZIP_ROOT,
         help="Folder for batch zip files (zip mode, default: transfer_zips).",
     )
+    parser.add_argument(
+        "--zip-compression",
+        choices=sorted(ZIP_COMPRESSION_MODES),
+        default=DEFAULT_ZIP_COMPRESSION,
+        help=(
+            "Zip compression: stored (default), fast (deflate level 1), deflated, "
+            "or auto (store already-compressed DICOM/JPEG, deflate the rest)."
+        ),
+    )
+    parser.add_argument(
+        "--zip-backend",
+        choices=ZIP_BACKENDS,
+        default=DEFAULT_ZIP_BACKEND,
+        help=(
+            "Zip writer: python (default), tar, 7z, or auto (Windows tar.exe if present). "
+            "tar and 7z also write entries for subfolders."
+        ),
+    )
     parser.add_argument(
         "--keep-zip",
         action="store_true",
@@ -485,6 +1306,19 @@ def main():
         action="store_true",
         help="Skip clearing the storage folder.",
     )
+    parser.add_argument(
+        "--pipeline-zip",
+        action="store_true",
+        help=(
+            "Zip mode: move each batch out of the storage folder and zip it in the "
+            "background while the next batch downloads (zip root must be on the same drive)."
+        ),
+    )
+    parser.add_argument(
+        "--worker-mode",
+        action="store_true",
+        help="Keep one dicom_downloader process running for all batches instead of one per batch.",
+    )
     parser.add_argument(
         "--stop-on-error",
         action="store_true",
@@ -494,7 +1328,7 @@ def main():
         "--tmp-cleanup-hours",
         type=float,
         default=DEFAULT_TMP_CLEANUP_HOURS,
-        help="Cleanup batch_tmp entries older than N hours (default: 24, 0 to disable).",
+        help="Cleanup %%TEMP%%\\fudownload_batch_tmp entries older than N hours (default: 24, 0 to disable).",
     )
     parser.add_argument(
         "--zip-cleanup-hours",
@@ -571,7 +1405,9 @@ def main():
     zip_root_input = args.transfer_folder or args.zip_root
     zip_root = resolve_path(zip_root_input, script_dir)
     transfer_root = resolve_transfer_root(args.transfer_root, script_dir)
-    batch_tmp_root = script_dir / "batch_tmp"
+    # Batch CSVs live a few seconds; %TEMP% is local and, with the
+    # short-lived hint in write_chunk_csv, usually never leaves the cache.
+    batch_tmp_root = Path(tempfile.gettempdir()) / "fudownload_batch_tmp"
     cleanup_interval_seconds = max(args.cleanup_interval_minutes, 0) * 60
     tmp_ttl_seconds = max(args.tmp_cleanup_hours, 0) * 3600
     zip_ttl_seconds = max(args.zip_cleanup_hours, 0) * 3600
@@ -580,6 +1416,11 @@ def main():
     if args.transfer_mode == "direct" and args.keep_zip:
         print("[transfer] Note: --keep-zip is ignored in direct mode.")
 
+    zip_backend = ("python", None)
+    if args.transfer_mode == "zip":
+        zip_backend = resolve_zip_backend(args.zip_backend)
+        print(f"[zip] backend={zip_backend[0]}")
+
     last_cleanup = maybe_run_cleanup(
         last_cleanup,
         cleanup_interval_seconds,
@@ -600,14 +1441,20 @@ def main():
         print("No CSV files found.")
         return 1
 
-    if not args.transfer_server:
-        print("Missing --transfer-server (or set FUTRANSFER_SERVER).")
+    # Built once: only "--folder <dir>" changes between batches.
+    base_transfer_args, transfer_err = build_transfer_args_base(args)
+    if transfer_err:
+        print(transfer_err)
         return 1
 
-    run_bat = script_dir / "run.bat"
-    if not run_bat.exists():
-        print(f"Missing run.bat at {run_bat}")
+    # Call dicom_downloader.py with this interpreter instead of going through
+    # run.bat: run_with_transfer.bat already set up the same embedded Python
+    # environment, so this saves a cmd.exe launch per batch.
+    downloader_script = script_dir / "dicom_downloader.py"
+    if not downloader_script.exists():
+        print(f"Missing dicom_downloader.py at {downloader_script}")
         return 1
+    download_cmd_prefix = [sys.executable, str(downloader_script), "--batch"]
 
     run_client = transfer_root / "run_client.bat"
     if not run_client.exists():
@@ -618,7 +1465,8 @@ def main():
         print("Warning: This wrapper is intended for Windows (.bat execution).")
 
     monitor = None
-    if DownloadMonitor and not args.no_monitor:
+    DownloadMonitor = None if args.no_monitor else load_download_monitor()
+    if DownloadMonitor:
         monitor = DownloadMonitor(
             host=args.monitor_host,
             port=args.monitor_port,
@@ -633,55 +1481,146 @@ def main():
             csv_total=len(csv_files),
         )
 
-    overall_ok = True
+    state = RunState(monitor, args.stop_on_error)
     run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    temp_root = script_dir / "batch_tmp" / run_id
+    temp_root = batch_tmp_root / run_id
     total_cases = 0
     total_batches = 0
-    cases_done = 0
-    batches_done = 0
-    errors_count = 0
     skipped_total = 0
 
+    script_dir_str = str(script_dir)
+    transfer_root_str = str(transfer_root)
+    transfer_cmd_prefix = ["cmd", "/c", str(run_client), *base_transfer_args, "--folder"]
+
+    def transfer_batch(job):
+        transfer_cmd = transfer_cmd_prefix + [str(job.transfer_source)]
+        if monitor:
+            monitor.update(phase="transfer")
+            monitor.log_event(f"Transfer start (batch {job.batch_label})", "INFO")
+        transfer_rc = run_cmd(transfer_cmd, cwd=transfer_root_str, dry_run=args.dry_run)
+        if transfer_rc != 0:
+            print(f"[transfer] Failed with code {transfer_rc}")
+            if state.fail("transfer_error", f"Transfer failed (code {transfer_rc})"):
+                return
+        elif args.transfer_mode == "zip":
+            if not args.keep_zip and not args.dry_run:
+                try:
+                    job.zip_path.unlink()
+                    if job.batch_dir.exists() and not any(job.batch_dir.iterdir()):
+                        job.batch_dir.rmdir()
+                except Exception as exc:
+                    print(f"[zip] Failed to remove {job.zip_path}: {exc}")
+                    if state.fail("zip_cleanup_error", f"Zip cleanup failed: {exc}", "WARNING"):
+                        return
+        elif not args.no_clear:
+            if monitor:
+                monitor.update(phase="clear")
+            cleared = clear_directory_contents(clear_path, dry_run=args.dry_run)
+            if not cleared:
+                print("[clear] Completed with errors.")
+                if state.fail("clear_error", "Clear completed with errors", "WARNING"):
+                    return
+
+        if not args.dry_run:
+            try:
+                job.temp_csv.unlink()
+            except Exception:
+                pass
+
+        state.batch_done(job.case_count)
+
+    # In zip mode the storage folder is already zipped and cleared before the
+    # transfer starts, so transfers run on a worker while the next batch
+    # downloads. Direct mode transfers straight from the storage folder and
+    # must finish before the next download can start.
+    def zip_staged_batch(job):
+        if monitor:
+            monitor.update(phase="zip")
+        zipped = zip_storage_contents(
+            job.staging_dir,
+            job.zip_path,
+            compression=args.zip_compression,
+            backend=zip_backend,
+        )
+        if not zipped:
+            # The staging folder is the only copy of this batch; keep it.
+            print(f"[zip] Failed to create zip. Skipping transfer; batch kept in {job.staging_dir}")
+            state.fail("zip_error", f"Zip failed; skipping transfer (batch kept in {job.staging_dir})")
+            return
+        try:
+            fast_rmtree(job.staging_dir)
+        except OSError as exc:
+            print(f"[stage] Failed to remove {job.staging_dir}: {exc}")
+            if state.fail("clear_error", f"Staging cleanup failed: {exc}", "WARNING"):
+                return
+        job.transfer_source = job.batch_dir
+        transfer_worker.submit(job)
+
+    transfer_worker = None
+    if args.transfer_mode == "zip":
+        transfer_worker = TransferWorker(transfer_batch, state)
+
+    # With --pipeline-zip the storage folder is emptied by renaming the batch
+    # into a staging folder, so zipping overlaps the next download as well.
+    zip_worker = None
+    staging_root = zip_root / ZIP_STAGING_DIR_NAME
+    if args.pipeline_zip:
+        if args.transfer_mode != "zip" or args.no_clear or args.dry_run:
+            print("[stage] Note: --pipeline-zip needs zip mode with clearing; ignored.")
+        else:
+            zip_worker = TransferWorker(zip_staged_batch, state, label="zip")
+
+    download_server = None
+    if args.worker_mode and not args.dry_run:
+        download_server = DownloadServer(
+            [sys.executable, str(downloader_script), "--serve", *download_args],
+            script_dir_str,
+        )
+        if not download_server.start():
+            print("[download] --serve not available; starting one process per batch.")
+
     for csv_index, csv_file in enumerate(csv_files, 1):
+        if state.stopped:
+            break
+        csv_stem = csv_file.stem
+        csv_name = csv_file.name
         print(f"=== Processing {csv_file} ===")
         if monitor:
             monitor.update(
-                current_csv=csv_file.name,
+                current_csv=csv_name,
                 csv_index=csv_index,
                 phase="parse",
             )
             monitor.log_event(f"Processing {csv_file}", "INFO")
-        case_data = parse_case_list(csv_file)
-        rows = case_data["rows"]
-        skipped = case_data["skipped"]
-        if skipped:
-            print(f"[batch] Skipped {skipped} invalid rows.")
+        estimated_cases = estimate_case_count(csv_file)
+        estimated_batches = (estimated_cases + args.batch_size - 1) // args.batch_size
+        csv_batches = estimated_batches
+        total_cases += estimated_cases
+        total_batches += estimated_batches
+        if estimated_cases:
             if monitor:
-                skipped_total += skipped
-                monitor.update(cases_skipped=skipped_total)
-                monitor.log_event(f"Skipped {skipped} invalid rows", "WARNING")
-        if not rows:
-            print("[batch] No valid cases found.")
-            if monitor:
-                monitor.log_event("No valid cases found", "WARNING")
-            continue
-
-        temp_dir = temp_root / csv_file.stem
-        temp_dir.mkdir(parents=True, exist_ok=True)
-        csv_batches = (len(rows) + args.batch_size - 1) // args.batch_size
-        total_cases += len(rows)
-        total_batches += csv_batches
-        if monitor:
-            monitor.update(
-                cases_total=total_cases,
-                batches_total=total_batches,
-                current_batch_total=csv_batches,
-                phase="ready",
-            )
-        print(f"[batch] {len(rows)} cases -> {csv_batches} batch(es)")
-
-        for batch_index, chunk in chunk_rows(rows, args.batch_size):
+                monitor.update(
+                    cases_total=total_cases,
+                    batches_total=total_batches,
+                    current_batch_total=csv_batches,
+                    phase="ready",
+                )
+            print(f"[batch] Up to {estimated_cases} cases -> {csv_batches} batch(es)")
+
+        temp_dir = temp_root / csv_stem
+        case_stats = {"skipped": 0}
+        csv_cases = 0
+        csv_batches_read = 0
+        batches = iter_case_batches(csv_file, args.batch_size, case_stats)
+
+        for batch_index, has_header, fieldnames, chunk in batches:
+            if state.stopped:
+                break
+            if batch_index == 1:
+                temp_dir.mkdir(parents=True, exist_ok=True)
+            csv_cases += len(chunk)
+            csv_batches_read = batch_index
+            csv_batches = max(csv_batches, batch_index)
             print(f"[batch] Starting {batch_index}/{csv_batches}")
             if monitor:
                 monitor.update(
@@ -690,144 +1629,87 @@ def main():
                     phase="download",
                 )
                 monitor.log_event(f"Batch {batch_index}/{csv_batches} download start", "INFO")
-            temp_csv = temp_dir / f"{csv_file.stem}_batch{batch_index:03d}.csv"
+            temp_csv = temp_dir / f"{csv_stem}_batch{batch_index:03d}.csv"
             if not args.dry_run:
                 write_chunk_csv(
                     temp_csv,
                     chunk,
-                    case_data["has_header"],
-                    case_data["fieldnames"],
+                    has_header,
+                    fieldnames,
                 )
 
-            download_cmd = ["cmd", "/c", str(run_bat), "--batch", str(temp_csv)]
-            download_cmd.extend(download_args)
-            download_rc = run_cmd(download_cmd, cwd=str(script_dir), dry_run=args.dry_run)
+            download_cmd = download_cmd_prefix + [str(temp_csv), *download_args]
+            if download_server and download_server.running:
+                download_rc = download_server.run_batch(str(temp_csv))
+            else:
+                download_rc = run_cmd(download_cmd, cwd=script_dir_str, dry_run=args.dry_run)
             if download_rc != 0:
-                overall_ok = False
                 print(f"[download] Failed with code {download_rc}")
-                errors_count += 1
-                if monitor:
-                    monitor.update(errors=errors_count, phase="download_error")
-                    monitor.log_event(f"Download failed (code {download_rc})", "ERROR")
-                if args.stop_on_error:
+                if state.fail("download_error", f"Download failed (code {download_rc})"):
                     break
 
-            transfer_source = None
-            batch_dir = None
-            zip_path = None
+            job = BatchJob(
+                batch_label=f"{batch_index}/{csv_batches}",
+                case_count=len(chunk),
+                temp_csv=temp_csv,
+            )
 
             if args.transfer_mode == "zip":
-                if monitor:
-                    monitor.update(phase="zip")
-                batch_dir = zip_root / f"{csv_file.stem}_batch{batch_index:03d}_{run_id}"
-                zip_path = batch_dir / f"{csv_file.stem}_batch{batch_index:03d}.zip"
-                zipped = zip_storage_contents(clear_path, zip_path, dry_run=args.dry_run)
-                if not zipped:
-                    overall_ok = False
-                    print("[zip] Failed to create zip. Skipping transfer.")
-                    errors_count += 1
+                job.batch_dir = zip_root / f"{csv_stem}_batch{batch_index:03d}_{run_id}"
+                job.zip_path = job.batch_dir / f"{csv_stem}_batch{batch_index:03d}.zip"
+                staged = False
+                if zip_worker:
                     if monitor:
-                        monitor.update(errors=errors_count, phase="zip_error")
-                        monitor.log_event("Zip failed; skipping transfer", "ERROR")
-                    if args.stop_on_error:
-                        break
-                    continue
-
-                if not args.no_clear:
+                        monitor.update(phase="stage")
+                    job.staging_dir = staging_root / job.batch_dir.name
+                    staged = move_storage_contents(clear_path, job.staging_dir)
+                    if staged:
+                        zip_worker.submit(job)
+                    else:
+                        print("[stage] Falling back to zipping in place for the rest of the run.")
+                        zip_worker.close()
+                        zip_worker = None
+
+                if not staged:
                     if monitor:
-                        monitor.update(phase="clear")
-                    cleared = clear_directory_contents(clear_path, dry_run=args.dry_run)
-                    if not cleared:
-                        overall_ok = False
-                        print("[clear] Completed with errors.")
-                        errors_count += 1
-                        if monitor:
-                            monitor.update(errors=errors_count, phase="clear_error")
-                            monitor.log_event("Clear completed with errors", "WARNING")
-                        if args.stop_on_error:
+                        monitor.update(phase="zip")
+                    zipped = zip_storage_contents(
+                        clear_path,
+                        job.zip_path,
+                        dry_run=args.dry_run,
+                        compression=args.zip_compression,
+                        backend=zip_backend,
+                    )
+                    if not zipped:
+                        print("[zip] Failed to create zip. Skipping transfer.")
+                        if state.fail("zip_error", "Zip failed; skipping transfer"):
                             break
+                        continue
 
-                transfer_source = batch_dir
-            else:
-                if monitor:
-                    monitor.update(phase="transfer_check")
-                if not has_any_files(clear_path, dry_run=args.dry_run):
-                    overall_ok = False
-                    print("[transfer] Skipping transfer due to missing files.")
-                    errors_count += 1
-                    if monitor:
-                        monitor.update(errors=errors_count, phase="transfer_error")
-                        monitor.log_event("Missing files; skipping transfer", "ERROR")
-                    if args.stop_on_error:
-                        break
-                    continue
-                transfer_source = Path(clear_path)
-
-            transfer_args, transfer_err = build_transfer_args(args, transfer_source)
-            if transfer_err:
-                print(transfer_err)
-                return 1
-
-            transfer_cmd = ["cmd", "/c", str(run_client)]
-            transfer_cmd.extend(transfer_args)
-            if monitor:
-                monitor.update(phase="transfer")
-                monitor.log_event(f"Transfer start (batch {batch_index}/{csv_batches})", "INFO")
-            transfer_rc = run_cmd(transfer_cmd, cwd=str(transfer_root), dry_run=args.dry_run)
-            if transfer_rc != 0:
-                overall_ok = False
-                print(f"[transfer] Failed with code {transfer_rc}")
-                errors_count += 1
-                if monitor:
-                    monitor.update(errors=errors_count, phase="transfer_error")
-                    monitor.log_event(f"Transfer failed (code {transfer_rc})", "ERROR")
-                if args.stop_on_error:
-                    break
-            else:
-                if args.transfer_mode == "zip":
-                    if not args.keep_zip and not args.dry_run:
-                        try:
-                            zip_path.unlink()
-                            if batch_dir.exists() and not any(batch_dir.iterdir()):
-                                batch_dir.rmdir()
-                        except Exception as exc:
-                            overall_ok = False
-                            print(f"[zip] Failed to remove {zip_path}: {exc}")
-                            errors_count += 1
-                            if monitor:
-                                monitor.update(errors=errors_count, phase="zip_cleanup_error")
-                                monitor.log_event(f"Zip cleanup failed: {exc}", "WARNING")
-                            if args.stop_on_error:
-                                break
-                else:
                     if not args.no_clear:
                         if monitor:
                             monitor.update(phase="clear")
                         cleared = clear_directory_contents(clear_path, dry_run=args.dry_run)
                         if not cleared:
-                            overall_ok = False
                             print("[clear] Completed with errors.")
-                            errors_count += 1
-                            if monitor:
-                                monitor.update(errors=errors_count, phase="clear_error")
-                                monitor.log_event("Clear completed with errors", "WARNING")
-                            if args.stop_on_error:
+                            if state.fail("clear_error", "Clear completed with errors", "WARNING"):
                                 break
 
-            if not args.dry_run:
-                try:
-                    temp_csv.unlink()
-                except Exception:
-                    pass
+                    job.transfer_source = job.batch_dir
+                    transfer_worker.submit(job)
+            else:
+                if monitor:
+                    monitor.update(phase="transfer_check")
+                if not has_any_files(clear_path, dry_run=args.dry_run):
+                    print("[transfer] Skipping transfer due to missing files.")
+                    if state.fail("transfer_error", "Missing files; skipping transfer"):
+                        break
+                    continue
+                job.transfer_source = Path(clear_path)
+                transfer_batch(job)
 
-            cases_done += len(chunk)
-            batches_done += 1
             if monitor:
-                monitor.update(
-                    cases_done=cases_done,
-                    batches_done=batches_done,
-                    phase="idle",
-                )
+                monitor.update(phase="idle")
 
             last_cleanup = maybe_run_cleanup(
                 last_cleanup,
@@ -838,12 +1720,52 @@ def main():
                 zip_ttl_seconds,
                 dry_run=args.dry_run,
             )
+        else:
+            # Reconcile the prepass estimate with the rows actually streamed.
+            total_cases += csv_cases - estimated_cases
+            total_batches += csv_batches_read - estimated_batches
+            if monitor and (csv_cases != estimated_cases or csv_batches_read != estimated_batches):
+                monitor.update(
+                    cases_total=total_cases,
+                    batches_total=total_batches,
+                    current_batch_total=csv_batches_read,
+                )
+        batches.close()
 
-        if args.stop_on_error and not overall_ok:
-            break
+        skipped = case_stats["skipped"]
+        if skipped:
+            print(f"[batch] Skipped {skipped} invalid rows.")
+            if monitor:
+                skipped_total += skipped
+                monitor.update(cases_skipped=skipped_total)
+                monitor.log_event(f"Skipped {skipped} invalid rows", "WARNING")
+        if not csv_cases:
+            print("[batch] No valid cases found.")
+            if monitor:
+                monitor.log_event("No valid cases found", "WARNING")
+
+    if download_server:
+        download_server.close()
+    if zip_worker:
+        zip_worker.close()
+    if transfer_worker:
+        transfer_worker.close()
+    if args.pipeline_zip and staging_root.exists():
+        # Batches staged after a stop are never zipped; say where their files are.
+        for entry in staging_root.iterdir():
+            print(f"[stage] Batch data not zipped, left in {entry}")
+        try:
+            staging_root.rmdir()
+        except OSError:
+            pass
+
+    overall_ok = state.ok
 
     if not args.dry_run and temp_root.exists():
-        shutil.rmtree(temp_root, ignore_errors=True)
+        try:
+            fast_rmtree(temp_root)
+        except OSError:
+            shutil.rmtree(temp_root, ignore_errors=True)
 
     if monitor:
         monitor.update(
@@ -10,16 +10,26 @@ import yaml
 import logging
 import argparse
 import csv
+import itertools
 import threading
 import time
 import re
 import json
+import shlex
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import List, Tuple, Optional
+
+try:
+    import orjson  # Optional; not bundled with the embedded Python
+except ImportError:
+    orjson = None
 
 from pydicom.dataset import Dataset
-from pynetdicom import AE, evt, StoragePresentationContexts
+from pynetdicom import AE, ALL_TRANSFER_SYNTAXES, evt, StoragePresentationContexts
 from pynetdicom.sop_class import (
     PatientRootQueryRetrieveInformationModelFind,
     PatientRootQueryRetrieveInformationModelMove,
@@ -27,15 +37,151 @@ from pynetdicom.sop_class import (
     StudyRootQueryRetrieveInformationModelMove
 )
 
+# Marks protocol lines on stdout in --serve mode; all other output is passed through.
+SERVE_RESULT_PREFIX = '@@serve '
+
+DEFAULT_MAX_PARALLEL = 4
+FIND_CACHE_SIZE = 256  # (server, patient, date) C-FIND results kept per batch
+
+REPORT_BAR = "=" * 50 + "\n"
+REPORT_RULE = "-" * 50 + "\n"
+
+# parse_server_info formats, tried in one search:
+#   "Name: Host 10.x.x.x AE Title XXX Port 104"  -> groups 1-3
+#   "10.x.x.x XXX 104" (IP, AE Title, Port)      -> groups 4-6
+SERVER_INFO_RE = re.compile(
+    r'(?:Host|IP)[:\s]+([0-9.]+).*?(?:AE|Title)[:\s]+([\w]+).*?Port[:\s]+(\d+)'
+    r'|^([0-9.]+)\s+([\w]+)\s+(\d+)$',
+    re.IGNORECASE
+)
+# Fallback: key-value pairs in any order
+SERVER_KEY_VALUE_RE = re.compile(r'(ip|host|ae_title|aetitle|port)[:\s]+([\w.]+)', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+# --parse-servers lines: "XX ..." marks a server line, "NAME: details" names it
+SERVER_LINE_PREFIX_RE = re.compile(r'^[A-Z]{2}\s')
+SERVER_LINE_NAME_RE = re.compile(r'^([A-Z]{2,})\s*[:]*\s*(.+)$')
+
+
+def load_json_file(path):
+    """Read a JSON file with orjson when available"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def dump_json_file(path, data):
+    """Write data as indented JSON (UTF-8) with orjson when available"""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def study_modalities(identifier):
+    """Upper-case modalities a C-FIND response lists for its study (empty if none)"""
+    modalities = set()
+    for keyword in ('ModalitiesInStudy', 'Modality'):
+        value = getattr(identifier, keyword, None)
+        if not value:
+            continue
+        values = [value] if isinstance(value, str) else value
+        modalities.update(str(v).strip().upper() for v in values if str(v).strip())
+    return frozenset(modalities)
+
+
+def format_timestamp(ts):
+    """Result records store time.time(); format it only when a report is written"""
+    return datetime.fromtimestamp(ts).isoformat()
+
+
+class AssociationPool:
+    """Open associations to one server, at most `limit` at a time"""
+
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self.idle = []
+        self.open = 0
+        self.cond = threading.Condition()
+
+    def checkout(self, connect):
+        """Take an idle association, or open one with connect() when under the limit"""
+        with self.cond:
+            while True:
+                while self.idle:
+                    assoc = self.idle.pop()
+                    if assoc.is_established:
+                        return assoc
+                    self.open -= 1
+                if self.open < self.limit:
+                    self.open += 1
+                    break
+                self.cond.wait()
+
+        assoc = None
+        try:
+            assoc = connect()
+        finally:
+            if assoc is None:
+                with self.cond:
+                    self.open -= 1
+                    self.cond.notify()
+        return assoc
+
+    def checkin(self, assoc, keep=True):
+        """Return an association for reuse, or abort it (keep=False) and free its slot"""
+        if keep and assoc.is_established:
+            with self.cond:
+                self.idle.append(assoc)
+                self.cond.notify()
+            return
+        if assoc.is_established:
+            assoc.abort()
+        with self.cond:
+            self.open -= 1
+            self.cond.notify()
+
+    def close(self):
+        """Release idle associations; ones still checked out are unaffected"""
+        with self.cond:
+            idle, self.idle = self.idle, []
+            self.open -= len(idle)
+            self.cond.notify_all()
+        for assoc in idle:
+            if assoc.is_established:
+                assoc.release()
+
 
 class DICOMDownloader:
     def __init__(self, config_file='config.yaml'):
         """Initialize the DICOM Downloader with configuration"""
         self.config = self.load_config(config_file)
+        self._build_server_index()
+        self._run_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self._log_dir = Path('logs')
         self.setup_logging()
         self.failed_downloads = []
         self.successful_downloads = []
         self.move_requests = []  # Track all C-MOVE requests
+        self._ae = None
+        self._pools = {}  # (ip, port, ae_title) -> AssociationPool
+        self._pools_lock = threading.Lock()
+        self._results_lock = threading.Lock()  # Guards the three result lists above
+        # (server, study_uid) moved this batch, and moves in flight on other workers
+        self._moved_studies = set()
+        self._moving_studies = {}
+        self._storage_scp = None  # In-process C-MOVE destination (run_local_scp)
+        self._find_template, self._move_template = self._build_request_templates()
+        # (server, ip, port, ae_title, patient_id, study_date) -> Future of the
+        # any-modality C-FIND result; the endpoint is part of the key because
+        # an inline server spec can re-register a name elsewhere
+        self._find_cache = OrderedDict()
+        self._find_cache_lock = threading.Lock()
+        self._servers_without_modalities = set()  # Can't filter their results locally
+        self._servers_lock = threading.Lock()  # Guards add_server (batch rows run in parallel)
 
     def load_config(self, config_file):
         """Load configuration from YAML file"""
@@ -43,13 +189,15 @@ class DICOMDownloader:
             with open(config_file, 'r') as f:
                 config = yaml.safe_load(f)
 
-            # Load additional servers from external file if exists
+            # Load additional servers from external file if exists; kept in
+            # memory so add_server doesn't re-read it (see flush_additional_servers)
+            self._additional_servers = {}
+            self._additional_servers_dirty = False
             additional_servers_file = Path('additional_servers.json')
             if additional_servers_file.exists():
                 try:
-                    with open(additional_servers_file, 'r') as f:
-                        additional_servers = json.load(f)
-                        config['servers'].update(additional_servers)
+                    self._additional_servers = load_json_file(additional_servers_file)
+                    config['servers'].update(self._additional_servers)
                 except Exception as e:
                     print(f"Warning: Could not load additional servers: {e}")
 
@@ -68,14 +216,13 @@ class DICOMDownloader:
         console_handler.setFormatter(logging.Formatter(log_format))
 
         # File handler
-        log_dir = Path('logs')
         try:
-            log_dir.mkdir(parents=True, exist_ok=True)
+            self._log_dir.mkdir(parents=True, exist_ok=True)
         except Exception as e:
-            print(f"Warning: Could not create log directory '{log_dir}': {e}")
-            log_dir = Path('.')
+            print(f"Warning: Could not create log directory '{self._log_dir}': {e}")
+            self._log_dir = Path('.')
 
-        log_file = log_dir / f"dicom_download_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        log_file = self._log_dir / f"dicom_download_{self._run_stamp}.log"
         file_handler = logging.FileHandler(log_file)
         file_handler.setFormatter(logging.Formatter(log_format))
 
@@ -85,97 +232,205 @@ class DICOMDownloader:
         self.logger.addHandler(console_handler)
         self.logger.addHandler(file_handler)
 
-    def send_c_move(self, server_config, study_uid):
-        """Send C-MOVE command to PACS server"""
-        # Get destination AE title from config
-        destination_ae = self.config.get('move_destination', {}).get('ae_title', 'LQC6')
-        calling_ae = self.config.get('local_ae', {}).get('ae_title', 'GEPACS')
-
-        self.logger.info(f"Using Calling AE: {calling_ae}, Destination AE: {destination_ae}")
-
-        # Use configured calling AE title
-        ae = AE(ae_title=calling_ae)
-
-        # Add C-MOVE contexts
-        ae.add_requested_context(PatientRootQueryRetrieveInformationModelMove)
-        ae.add_requested_context(StudyRootQueryRetrieveInformationModelMove)
+    def start_storage_scp(self):
+        """Listen as the C-MOVE destination in this process (move_destination.run_local_scp)"""
+        move_cfg = self.config.get('move_destination', {})
+        if not move_cfg.get('run_local_scp') or self._storage_scp is not None:
+            return
+        local_cfg = self.config.get('local_ae', {})
+        ae_title = move_cfg.get('ae_title', 'LQC6')
+        port = int(move_cfg.get('port', local_cfg.get('port', 11112)))
+        storage_dir = Path(move_cfg.get('storage_path') or local_cfg.get('storage_dir', 'downloads'))
+
+        ae = AE(ae_title=ae_title)
+        # Accept every transfer syntax: datasets are stored as received, never decoded
+        for context in StoragePresentationContexts:
+            ae.add_supported_context(context.abstract_syntax, ALL_TRANSFER_SYNTAXES)
+        try:
+            storage_dir.mkdir(parents=True, exist_ok=True)
+            self._storage_scp = ae.start_server(
+                ('', port),
+                block=False,
+                evt_handlers=[(evt.EVT_C_STORE, self._on_store, [storage_dir])]
+            )
+        except Exception as e:
+            self.logger.error(f"Could not start local Storage SCP on port {port}: {e}")
+            return
+        self.logger.info(f"Storage SCP '{ae_title}' listening on port {port}, saving to {storage_dir}")
+
+    def stop_storage_scp(self):
+        if self._storage_scp is not None:
+            self._storage_scp.shutdown()
+            self._storage_scp = None
+
+    def _on_store(self, event, storage_dir):
+        """Write the C-STORE dataset to disk exactly as encoded by the sender"""
+        sop_uid = event.request.AffectedSOPInstanceUID
+        try:
+            with open(storage_dir / f"{sop_uid}.dcm", 'wb') as f:
+                f.write(event.encoded_dataset())
+        except OSError as e:
+            self.logger.error(f"Could not store {sop_uid}: {e}")
+            return 0xA700  # Out of resources
+        return 0x0000
+
+    @staticmethod
+    def _build_request_templates():
+        """Pre-built elements for the fixed parts of the C-FIND and C-MOVE identifiers.
+
+        Each request starts from a copy of the tag -> element dict, so the
+        keyword/VR lookups for these tags happen once. The shared elements
+        are never modified.
+        """
+        find = Dataset()
+        find.QueryRetrieveLevel = 'STUDY'
+        find.StudyInstanceUID = ''  # Request this field to be returned
+        find.PatientName = ''
+        find.StudyDescription = ''
+        find.ModalitiesInStudy = ''  # Lets find_studies filter one result by modality
+
+        move = Dataset()
+        move.QueryRetrieveLevel = 'STUDY'
+
+        return (
+            {elem.tag: elem for elem in find},
+            {elem.tag: elem for elem in move}
+        )
 
+    def _get_ae(self):
+        """Build the calling AE once, with both C-FIND and C-MOVE contexts"""
+        with self._pools_lock:
+            if self._ae is None:
+                calling_ae = self.config.get('local_ae', {}).get('ae_title', 'GEPACS')
+                ae = AE(ae_title=calling_ae)
+                ae.add_requested_context(PatientRootQueryRetrieveInformationModelFind)
+                ae.add_requested_context(StudyRootQueryRetrieveInformationModelFind)
+                ae.add_requested_context(PatientRootQueryRetrieveInformationModelMove)
+                ae.add_requested_context(StudyRootQueryRetrieveInformationModelMove)
+                self._ae = ae
+            return self._ae
+
+    def _max_parallel(self, server_config=None):
+        """Worker count for batches, or the association limit for one server"""
+        default = self.config.get('settings', {}).get('max_parallel', DEFAULT_MAX_PARALLEL)
+        if server_config is None:
+            return int(default)
+        return int(server_config.get('max_parallel', default))
+
+    def _associate(self, server_config):
         try:
-            # Connect to PACS server
-            assoc = ae.associate(
+            assoc = self._get_ae().associate(
                 server_config['ip'],
                 server_config['port'],
-                ae_title=server_config['ae_title']
+                ae_title=server_config['ae_title'],
+                max_pdu=0
             )
+        except Exception as e:
+            self.logger.error(f"Error connecting to {server_config['description']}: {e}")
+            return None
+        if not assoc.is_established:
+            return None
+        self.logger.info(f"Connected to {server_config['description']}")
+        return assoc
+
+    @contextmanager
+    def _association(self, server_config):
+        """Borrow an open association to the server (None if it can't be established)
+
+        Associations go back to the server's pool for reuse by later requests;
+        one that raised an error is aborted instead.
+        """
+        key = (server_config['ip'], server_config['port'], server_config['ae_title'])
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = AssociationPool(self._max_parallel(server_config))
+
+        assoc = pool.checkout(lambda: self._associate(server_config))
+        keep = False
+        try:
+            yield assoc
+            keep = True
+        finally:
+            if assoc is not None:
+                pool.checkin(assoc, keep=keep)
+
+    def release_associations(self):
+        """Release every idle association (end of a batch or single query)"""
+        with self._pools_lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            try:
+                pool.close()
+            except Exception as e:
+                self.logger.debug(f"Error releasing association: {e}")
 
-            if assoc.is_established:
-                self.logger.info(f"Connected to {server_config['description']} for C-MOVE")
+    def _send_c_move_on(self, assoc, study_uid):
+        """Send a study-level C-MOVE on an open association"""
+        # Get destination AE title from config
+        destination_ae = self.config.get('move_destination', {}).get('ae_title', 'LQC6')
+        calling_ae = self.config.get('local_ae', {}).get('ae_title', 'GEPACS')
 
-                # Create move request dataset
-                ds = Dataset()
-                ds.QueryRetrieveLevel = 'STUDY'
-                ds.StudyInstanceUID = study_uid
+        self.logger.info("Using Calling AE: %s, Destination AE: %s", calling_ae, destination_ae)
 
-                # Send C-MOVE request with destination AE
-                responses = assoc.send_c_move(
-                    ds,
-                    destination_ae,  # Destination AE title from config
-                    StudyRootQueryRetrieveInformationModelMove
-                )
+        # Create move request dataset
+        ds = Dataset(dict(self._move_template))
+        ds.StudyInstanceUID = study_uid
 
-                move_successful = False
-                for (status, identifier) in responses:
-                    if status:
-                        if status.Status == 0x0000:
-                            self.logger.info("C-MOVE completed successfully")
-                            move_successful = True
-                        elif status.Status == 0xFF00:
-                            self.logger.debug("C-MOVE pending...")
-                        else:
-                            self.logger.warning(f"C-MOVE status: 0x{status.Status:04x}")
+        # Send C-MOVE request with destination AE
+        responses = assoc.send_c_move(
+            ds,
+            destination_ae,  # Destination AE title from config
+            StudyRootQueryRetrieveInformationModelMove
+        )
 
-                assoc.release()
-                return move_successful
-            else:
-                self.logger.error("Failed to establish association for C-MOVE")
-                return False
+        # Pending statuses arrive once per sub-operation; check the level once
+        debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
+        move_successful = False
+        for (status, identifier) in responses:
+            if status:
+                if status.Status == 0x0000:
+                    self.logger.info("C-MOVE completed successfully")
+                    move_successful = True
+                elif status.Status == 0xFF00:
+                    if debug_enabled:
+                        self.logger.debug("C-MOVE pending...")
+                else:
+                    self.logger.warning("C-MOVE status: 0x%04x", status.Status)
+
+        return move_successful
+
+    def send_c_move(self, server_config, study_uid):
+        """Send C-MOVE command to PACS server"""
+        try:
+            # Connect to PACS server (or reuse an open association)
+            with self._association(server_config) as assoc:
+                if not assoc:
+                    self.logger.error("Failed to establish association for C-MOVE")
+                    return False
+                return self._send_c_move_on(assoc, study_uid)
 
         except Exception as e:
             self.logger.error(f"Error during C-MOVE: {e}")
             return False
 
     def query_studies(self, server_config, patient_id, study_date, modality):
-        """Perform C-FIND query to find matching studies"""
-        # Use configured calling AE title
-        calling_ae = self.config.get('local_ae', {}).get('ae_title', 'GEPACS')
-        ae = AE(ae_title=calling_ae)
-        ae.add_requested_context(PatientRootQueryRetrieveInformationModelFind)
-        ae.add_requested_context(StudyRootQueryRetrieveInformationModelFind)
-
+        """Perform C-FIND query to find matching studies (None if the query failed)"""
         # Create query dataset
-        ds = Dataset()
-        ds.QueryRetrieveLevel = 'STUDY'
+        ds = Dataset(dict(self._find_template))
         ds.PatientID = patient_id
         ds.StudyDate = study_date.replace('-', '')  # Convert YYYY-MM-DD to YYYYMMDD
         if modality:
             ds.Modality = modality  # Use modality as-is (no wildcard needed for exact match)
-        ds.StudyInstanceUID = ''  # Request this field to be returned
-        ds.PatientName = ''
-        ds.StudyDescription = ''
 
         matching_studies = []
 
         try:
             timeout = self.config['settings']['query_timeout']
-            assoc = ae.associate(
-                server_config['ip'],
-                server_config['port'],
-                ae_title=server_config['ae_title'],
-                max_pdu=0
-            )
-
-            if assoc.is_established:
-                self.logger.info(f"Connected to {server_config['description']} for C-FIND")
+            with self._association(server_config) as assoc:
+                if not assoc:
+                    self.logger.error(f"Failed to establish association with {server_config['description']}")
+                    return None
 
                 # Send C-FIND request
                 responses = assoc.send_c_find(
@@ -184,26 +439,119 @@ class DICOMDownloader:
                 )
 
                 for (status, identifier) in responses:
-                    if status and identifier and status.Status != 0x0000:
+                    if not status or status.Status not in (0x0000, 0xFF00, 0xFF01):
+                        # Empty status: timeout or abort; anything else is a failure
+                        code = f"0x{status.Status:04X}" if status else "no response"
+                        self.logger.error(f"C-FIND failed ({code})")
+                        return None
+                    if identifier and status.Status != 0x0000:
                         if hasattr(identifier, 'StudyInstanceUID'):
+                            # pydicom values as returned (UID is a str subclass,
+                            # PersonName formats on str()); nothing here needs str()
                             matching_studies.append({
-                                'StudyInstanceUID': str(identifier.StudyInstanceUID),
-                                'PatientName': str(getattr(identifier, 'PatientName', '')),
-                                'StudyDescription': str(getattr(identifier, 'StudyDescription', ''))
+                                'StudyInstanceUID': identifier.StudyInstanceUID,
+                                'PatientName': getattr(identifier, 'PatientName', ''),
+                                'StudyDescription': getattr(identifier, 'StudyDescription', ''),
+                                'Modalities': study_modalities(identifier)
                             })
 
-                assoc.release()
-                self.logger.info(f"Found {len(matching_studies)} matching studies")
-
-            else:
-                self.logger.error(f"Failed to establish association with {server_config['description']}")
+                self.logger.info("Found %d matching studies", len(matching_studies))
 
         except Exception as e:
             self.logger.error(f"Error during C-FIND: {e}")
+            return None
 
         return matching_studies
 
 
+    def _build_server_index(self):
+        """Index configured server names for case-insensitive and numeric-suffix lookup.
+
+        Must be rebuilt whenever a server name is added to config['servers'].
+        """
+        names = list(self.config['servers'])
+        server_index = {}
+        prefix_index = {}
+        for name in names:
+            lower = name.lower()
+            server_index.setdefault(lower, name)
+            # Every split where the tail is all digits: LK12 is a fallback of LK and LK1
+            for cut in range(1, len(name)):
+                remainder = name[cut:]
+                if remainder.isdigit():
+                    prefix_index.setdefault(lower[:cut], []).append((int(remainder), name))
+        self._server_index = server_index
+        # Base (lowercase) -> fallback names in numeric order, ready to append
+        self._server_chain_index = {
+            base: tuple(name for _, name in sorted(suffixes))
+            for base, suffixes in prefix_index.items()
+        }
+
+    def find_studies(self, server_name, server_config, patient_id, study_date, modality):
+        """query_studies, sharing one any-modality C-FIND per (server, patient, date).
+
+        Lookup with --alt-modality asks the same server for the same patient
+        and date once per modality. Instead, the first request runs the query
+        without a modality, and later ones (including concurrent probes, which
+        wait for it) filter that result locally. Servers that don't return
+        ModalitiesInStudy/Modality fall back to a query per modality.
+        Failed queries (None) are not kept, so the next request asks again.
+        """
+        if (modality and any(c in modality for c in '*?')) or server_name in self._servers_without_modalities:
+            return self.query_studies(server_config, patient_id, study_date, modality)
+
+        key = (
+            server_name, server_config['ip'], server_config['port'], server_config['ae_title'],
+            patient_id, study_date,
+        )
+        with self._find_cache_lock:
+            future = self._find_cache.get(key)
+            owner = future is None
+            if owner:
+                future = self._find_cache[key] = Future()
+                if len(self._find_cache) > FIND_CACHE_SIZE:
+                    self._find_cache.popitem(last=False)
+            else:
+                self._find_cache.move_to_end(key)
+
+        if owner:
+            try:
+                result = self.query_studies(server_config, patient_id, study_date, None)
+            except BaseException as e:
+                self._drop_find_cache_entry(key, future)
+                future.set_exception(e)
+                raise
+            if result is None:
+                self._drop_find_cache_entry(key, future)
+            future.set_result(result)
+        studies = future.result()
+
+        if studies is None:
+            return None
+        if not modality:
+            return list(studies)
+        wanted = modality.upper()
+        matching = []
+        for study in studies:
+            if not study['Modalities']:
+                # No modality info to filter on; ask the server directly from now on
+                self._servers_without_modalities.add(server_name)
+                return self.query_studies(server_config, patient_id, study_date, modality)
+            if wanted in study['Modalities']:
+                matching.append(study)
+        if studies:
+            self.logger.info("Using cached C-FIND: %d of %d studies are %s", len(matching), len(studies), modality)
+        return matching
+
+    def _drop_find_cache_entry(self, key, future):
+        with self._find_cache_lock:
+            if self._find_cache.get(key) is future:
+                del self._find_cache[key]
+
+    def clear_find_cache(self):
+        with self._find_cache_lock:
+            self._find_cache.clear()
+
     def _resolve_server_name(self, server_name: Optional[str]) -> Optional[str]:
         """Resolve server name with case-insensitive matching."""
         if not server_name:
@@ -213,10 +561,7 @@ class DICOMDownloader:
             return None
         if server_name in self.config['servers']:
             return server_name
-        for configured_name in self.config['servers']:
-            if configured_name.lower() == server_name.lower():
-                return configured_name
-        return server_name
+        return self._server_index.get(server_name.lower(), server_name)
 
     def _expand_server_chain(self, server_name: Optional[str]) -> List[str]:
         """Expand server name to include numeric fallbacks (e.g., LK -> LK1, LK2)."""
@@ -224,20 +569,7 @@ class DICOMDownloader:
         if not resolved:
             return []
 
-        candidates = [resolved]
-        base_lower = resolved.lower()
-        suffixes = []
-
-        for configured_name in self.config['servers']:
-            if configured_name.lower().startswith(base_lower) and configured_name.lower() != base_lower:
-                remainder = configured_name[len(resolved):]
-                if remainder.isdigit():
-                    suffixes.append((int(remainder), configured_name))
-
-        for _, name in sorted(suffixes):
-            candidates.append(name)
-
-        return candidates
+        return [resolved, *self._server_chain_index.get(resolved.lower(), ())]
 
     def _dedupe_servers(self, servers: List[str]) -> List[str]:
         seen = set()
@@ -300,21 +632,24 @@ class DICOMDownloader:
         modality,
         server_name: Optional[str],
         lookup_servers: Optional[List[str]] = None,
-        alt_modalities: Optional[List[str]] = None
+        alt_modalities: Optional[List[str]] = None,
+        inline_servers: Optional[dict] = None
     ):
+        """inline_servers maps names to configs that override config['servers'] for this query"""
         candidates = self.build_server_candidates(server_name, lookup_servers)
         modality_candidates = self.build_modality_candidates(modality, alt_modalities)
         if not candidates:
             reason = "No servers available for lookup"
             self.logger.error(reason)
-            self.failed_downloads.append({
-                'patient_id': patient_id,
-                'date': study_date,
-                'modality': modality,
-                'server': server_name or 'lookup',
-                'reason': reason,
-                'timestamp': datetime.now().isoformat()
-            })
+            with self._results_lock:
+                self.failed_downloads.append({
+                    'patient_id': patient_id,
+                    'date': study_date,
+                    'modality': modality,
+                    'server': server_name or 'lookup',
+                    'reason': reason,
+                    'timestamp': time.time()
+                })
             return False
 
         if lookup_servers or len(candidates) > 1:
@@ -324,90 +659,176 @@ class DICOMDownloader:
 
         last_reason = None
         total_attempts = len(candidates) * len(modality_candidates)
-        attempt = 0
-        for server_index, candidate in enumerate(candidates, 1):
-            for modality_index, modality_value in enumerate(modality_candidates, 1):
-                attempt += 1
-                modality_label = modality_value or "ANY"
-                self.logger.info(
-                    f"Lookup attempt {attempt}/{total_attempts}: "
-                    f"{candidate} (modality {modality_label})"
-                )
+        workers = min(self._max_parallel(), total_attempts)
+        if workers > 1:
+            probes = [
+                (candidate, modality_value)
+                for candidate in candidates
+                for modality_value in modality_candidates
+            ]
+            success, last_reason = self._lookup_parallel(patient_id, study_date, probes, workers, inline_servers)
+            if success:
+                return True
+        else:
+            attempt = 0
+            for server_index, candidate in enumerate(candidates, 1):
+                for modality_index, modality_value in enumerate(modality_candidates, 1):
+                    attempt += 1
+                    modality_label = modality_value or "ANY"
+                    self.logger.info(
+                        "Lookup attempt %d/%d: %s (modality %s)",
+                        attempt, total_attempts, candidate, modality_label
+                    )
+                    success, reason = self.process_query(
+                        patient_id,
+                        study_date,
+                        modality_value,
+                        candidate,
+                        record_failure=False,
+                        inline_servers=inline_servers
+                    )
+                    if success:
+                        return True
+                    last_reason = reason
+
+        failure_reason = last_reason or "All lookup attempts failed"
+        modality_list = ', '.join(str(value) for value in modality_candidates if value)
+        modality_suffix = f"; modalities [{modality_list}]" if modality_list else ""
+        with self._results_lock:
+            self.failed_downloads.append({
+                'patient_id': patient_id,
+                'date': study_date,
+                'modality': modality,
+                'server': server_name or 'lookup',
+                'reason': f"{failure_reason}; tried {', '.join(candidates)}{modality_suffix}",
+                'timestamp': time.time()
+            })
+        return False
+
+    def _probe_server(self, patient_id, study_date, modality, server_name, inline_servers=None):
+        """C-FIND only, for parallel lookup; returns (studies, failure reason)"""
+        resolved_name = self._resolve_server_name(server_name)
+        server_config = self._server_config(resolved_name, inline_servers)
+        if server_config is None:
+            self.logger.error(f"Server '{server_name}' not found in configuration")
+            return [], 'Server not configured'
+        studies = self.find_studies(resolved_name, server_config, patient_id, study_date, modality)
+        if studies is None:
+            return [], 'C-FIND failed'
+        return studies, None if studies else 'No matching studies found'
+
+    def _lookup_parallel(self, patient_id, study_date, probes, workers, inline_servers=None):
+        """C-FIND every (server, modality) probe at once and C-MOVE from the first that answers.
+
+        If the C-MOVE fails, the next probe with matching studies is tried.
+        Probes still queued when one succeeds are cancelled; running ones are
+        waited for, so none is still querying (or holding an association)
+        once the row is done.
+        """
+        self.logger.info("Lookup: querying %d server/modality pairs in parallel", len(probes))
+        last_reason = None
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {
+                executor.submit(
+                    self._probe_server, patient_id, study_date, modality_value, candidate, inline_servers
+                ):
+                    (candidate, modality_value)
+                for candidate, modality_value in probes
+            }
+            for future in as_completed(futures):
+                candidate, modality_value = futures[future]
+                try:
+                    studies, reason = future.result()
+                except Exception as e:
+                    studies, reason = [], f"Lookup error: {e}"
+                if not studies:
+                    last_reason = reason
+                    continue
+
+                self.logger.info("Lookup hit: %s (modality %s)", candidate, modality_value or "ANY")
                 success, reason = self.process_query(
                     patient_id,
                     study_date,
                     modality_value,
                     candidate,
-                    record_failure=False
+                    record_failure=False,
+                    studies=studies,
+                    inline_servers=inline_servers
                 )
                 if success:
-                    return True
+                    return True, None
                 last_reason = reason
-
-        failure_reason = last_reason or "All lookup attempts failed"
-        modality_list = ', '.join(str(value) for value in modality_candidates if value)
-        modality_suffix = f"; modalities [{modality_list}]" if modality_list else ""
-        self.failed_downloads.append({
-            'patient_id': patient_id,
-            'date': study_date,
-            'modality': modality,
-            'server': server_name or 'lookup',
-            'reason': f"{failure_reason}; tried {', '.join(candidates)}{modality_suffix}",
-            'timestamp': datetime.now().isoformat()
-        })
-        return False
-
-    def process_query(self, patient_id, study_date, modality, server_name, record_failure=True):
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return False, last_reason
+
+    def _server_config(self, server_name, inline_servers=None):
+        """Config for server_name, preferring this query's inline servers; None if unknown"""
+        if inline_servers and server_name in inline_servers:
+            return inline_servers[server_name]
+        return self.config['servers'].get(server_name)
+
+    def process_query(
+        self, patient_id, study_date, modality, server_name, record_failure=True, studies=None, inline_servers=None
+    ):
         """Process a single query"""
         if not server_name:
             reason = "Server not specified"
             self.logger.error(reason)
             if record_failure:
-                self.failed_downloads.append({
-                    'patient_id': patient_id,
-                    'date': study_date,
-                    'modality': modality,
-                    'server': server_name or 'unknown',
-                    'reason': reason,
-                    'timestamp': datetime.now().isoformat()
-                })
+                with self._results_lock:
+                    self.failed_downloads.append({
+                        'patient_id': patient_id,
+                        'date': study_date,
+                        'modality': modality,
+                        'server': server_name or 'unknown',
+                        'reason': reason,
+                        'timestamp': time.time()
+                    })
             return False, reason
 
         resolved_name = self._resolve_server_name(server_name)
-        if resolved_name not in self.config['servers']:
+        server_config = self._server_config(resolved_name, inline_servers)
+        if server_config is None:
             reason = 'Server not configured'
             self.logger.error(f"Server '{server_name}' not found in configuration")
             if record_failure:
-                self.failed_downloads.append({
-                    'patient_id': patient_id,
-                    'date': study_date,
-                    'modality': modality,
-                    'server': server_name,
-                    'reason': reason,
-                    'timestamp': datetime.now().isoformat()
-                })
+                with self._results_lock:
+                    self.failed_downloads.append({
+                        'patient_id': patient_id,
+                        'date': study_date,
+                        'modality': modality,
+                        'server': server_name,
+                        'reason': reason,
+                        'timestamp': time.time()
+                    })
             return False, reason
 
         server_name = resolved_name
-        server_config = self.config['servers'][server_name]
 
-        self.logger.info(f"Processing: Patient={patient_id}, Date={study_date}, Modality={modality}, Server={server_name}")
+        self.logger.info(
+            "Processing: Patient=%s, Date=%s, Modality=%s, Server=%s",
+            patient_id, study_date, modality, server_name
+        )
 
-        # Query for studies
-        studies = self.query_studies(server_config, patient_id, study_date, modality)
+        # Query for studies (unless a parallel lookup probe already did)
+        if studies is None:
+            studies = self.find_studies(server_name, server_config, patient_id, study_date, modality)
 
         if not studies:
-            reason = 'No matching studies found'
+            reason = 'C-FIND failed' if studies is None else 'No matching studies found'
             self.logger.warning(reason)
             if record_failure:
-                self.failed_downloads.append({
-                    'patient_id': patient_id,
-                    'date': study_date,
-                    'modality': modality,
-                    'server': server_name,
-                    'reason': reason,
-                    'timestamp': datetime.now().isoformat()
-                })
+                with self._results_lock:
+                    self.failed_downloads.append({
+                        'patient_id': patient_id,
+                        'date': study_date,
+                        'modality': modality,
+                        'server': server_name,
+                        'reason': reason,
+                        'timestamp': time.time()
+                    })
             return False, reason
 
         # Send C-MOVE for each study
@@ -415,47 +836,71 @@ class DICOMDownloader:
         studies_moved = []
         failed_studies = []
 
-        for study in studies:
-            study_uid = study['StudyInstanceUID']
-            self.logger.info(f"Sending C-MOVE for study: {study_uid}")
+        # All studies share one association
+        with self._association(server_config) as assoc:
+            if not assoc:
+                self.logger.error("Failed to establish association for C-MOVE")
+
+            for study in studies:
+                study_uid = study['StudyInstanceUID']
+                study_key = (server_name, study_uid)
+                if self._begin_study_move(study_key):
+                    # Another row already pulled this study
+                    self.logger.info("Study %s already moved from %s; skipping C-MOVE", study_uid, server_name)
+                    studies_moved.append(study_uid)
+                    continue
+
+                self.logger.info("Sending C-MOVE for study: %s", study_uid)
+
+                # Send C-MOVE command
+                moved = False
+                try:
+                    if assoc:
+                        moved = self._send_c_move_on(assoc, study_uid)
+                except Exception as e:
+                    self.logger.error(f"Error during C-MOVE: {e}")
+                finally:
+                    self._end_study_move(study_key, moved)
+
+                if moved:
+                    studies_moved.append(study_uid)
+                    with self._results_lock:
+                        self.move_requests.append({
+                            'patient_id': patient_id,
+                            'date': study_date,
+                            'modality': modality,
+                            'server': server_name,
+                            'study_uid': study_uid,
+                            'status': 'SUCCESS',
+                            'timestamp': time.time()
+                        })
+                    storage_path = self.config.get('move_destination', {}).get('storage_path', 'Unknown')
+                    self.logger.info("C-MOVE request sent successfully for study %s", study_uid)
+                    self.logger.info("Study should be available at: %s", storage_path)
+                else:
+                    failed_studies.append(study_uid)
+                    if record_failure:
+                        with self._results_lock:
+                            self.failed_downloads.append({
+                                'patient_id': patient_id,
+                                'date': study_date,
+                                'modality': modality,
+                                'server': server_name,
+                                'reason': f'C-MOVE failed for study {study_uid}',
+                                'timestamp': time.time()
+                            })
+                    all_successful = False
 
-            # Send C-MOVE command
-            if self.send_c_move(server_config, study_uid):
-                studies_moved.append(study_uid)
-                self.move_requests.append({
+        if all_successful and studies_moved:
+            with self._results_lock:
+                self.successful_downloads.append({
                     'patient_id': patient_id,
                     'date': study_date,
                     'modality': modality,
                     'server': server_name,
-                    'study_uid': study_uid,
-                    'status': 'SUCCESS',
-                    'timestamp': datetime.now().isoformat()
+                    'studies': studies_moved,
+                    'timestamp': time.time()
                 })
-                storage_path = self.config.get('move_destination', {}).get('storage_path', 'Unknown')
-                self.logger.info(f"C-MOVE request sent successfully for study {study_uid}")
-                self.logger.info(f"Study should be available at: {storage_path}")
-            else:
-                failed_studies.append(study_uid)
-                if record_failure:
-                    self.failed_downloads.append({
-                        'patient_id': patient_id,
-                        'date': study_date,
-                        'modality': modality,
-                        'server': server_name,
-                        'reason': f'C-MOVE failed for study {study_uid}',
-                        'timestamp': datetime.now().isoformat()
-                    })
-                all_successful = False
-
-        if all_successful and studies_moved:
-            self.successful_downloads.append({
-                'patient_id': patient_id,
-                'date': study_date,
-                'modality': modality,
-                'server': server_name,
-                'studies': studies_moved,
-                'timestamp': datetime.now().isoformat()
-            })
 
         if not all_successful:
             reason = f"C-MOVE failed for {len(failed_studies)} of {len(studies)} studies"
@@ -471,58 +916,58 @@ class DICOMDownloader:
     ):
         """Process batch queries from CSV file"""
         self.logger.info(f"Processing batch file: {csv_file}")
+        self.clear_find_cache()  # Results are only reused within one batch
 
         def normalize_key(key: str) -> str:
             return ''.join(key.split()).lower()
 
-        def get_field(row: Dict, *candidates: str) -> Optional[str]:
-            for candidate in candidates:
-                if not candidate:
-                    continue
-                value = row.get(candidate)
-                if value is not None and str(value).strip():
-                    return str(value).strip()
+        def get_field(row: List[str], columns: Tuple[int, ...]) -> Optional[str]:
+            for column in columns:
+                if column < len(row):
+                    value = row[column].strip()
+                    if value:
+                        return value
             return None
 
+        queries = []
         try:
             with open(csv_file, 'r', newline='') as f:
-                first_line = f.readline()
-                f.seek(0)
-                header_line = normalize_key(first_line.lstrip('\ufeff'))
+                # One reader for both layouts; the first row is sniffed for a header
+                reader = csv.reader(f, skipinitialspace=True)
+                first_row = next(reader, [])
+                if first_row:
+                    first_row[0] = first_row[0].lstrip('\ufeff')
+                header_line = normalize_key(','.join(first_row))
                 has_header = any(token in header_line for token in (
                     'patientid', 'patient_id', 'studydate', 'study_date', 'date', 'modality', 'server'
                 ))
 
                 if has_header:
-                    reader = csv.DictReader(f)
+                    # Normalized header name -> column index
                     normalized_fields = {}
-                    for field in reader.fieldnames or []:
-                        if field is None:
-                            continue
-                        normalized_fields[normalize_key(field)] = field
+                    for index, field in enumerate(first_row):
+                        normalized_fields[normalize_key(field)] = index
+
+                    # Resolve the alias columns once, in priority order
+                    def columns(*aliases: str) -> Tuple[int, ...]:
+                        return tuple(normalized_fields[a] for a in aliases if a in normalized_fields)
+
+                    patient_columns = columns('patientid', 'patient_id', 'patient', 'id')
+                    date_columns = columns('studydate', 'study_date', 'date')
+                    modality_columns = columns('modality')
+                    server_columns = columns('server')
 
                     for row in reader:
                         if not row:
                             continue
-                        raw_patient = get_field(
-                            row,
-                            normalized_fields.get('patientid'),
-                            normalized_fields.get('patient_id'),
-                            normalized_fields.get('patient'),
-                            normalized_fields.get('id')
-                        )
+                        raw_patient = get_field(row, patient_columns)
                         if raw_patient and raw_patient.startswith('#'):
                             continue
 
                         patient_id = raw_patient
-                        study_date = get_field(
-                            row,
-                            normalized_fields.get('studydate'),
-                            normalized_fields.get('study_date'),
-                            normalized_fields.get('date')
-                        )
-                        modality = get_field(row, normalized_fields.get('modality'))
-                        server = get_field(row, normalized_fields.get('server'))
+                        study_date = get_field(row, date_columns)
+                        modality = get_field(row, modality_columns)
+                        server = get_field(row, server_columns)
 
                         if not all([patient_id, study_date, modality]):
                             self.logger.warning(f"Skipping row with missing fields: {row}")
@@ -532,17 +977,9 @@ class DICOMDownloader:
                             self.logger.warning(f"Skipping row with missing server: {row}")
                             continue
 
-                        self.process_query_with_inline_server(
-                            patient_id,
-                            study_date,
-                            modality,
-                            server,
-                            lookup_servers=lookup_servers,
-                            alt_modalities=alt_modalities
-                        )
+                        queries.append((patient_id, study_date, modality, server))
                 else:
-                    reader = csv.reader(f, skipinitialspace=True)
-                    for row in reader:
+                    for row in itertools.chain((first_row,), reader):
                         # Skip comments and empty lines
                         if not row or str(row[0]).strip().startswith('#'):
                             continue
@@ -558,106 +995,206 @@ class DICOMDownloader:
                             self.logger.warning(f"Skipping row with missing server: {row}")
                             continue
 
-                        self.process_query_with_inline_server(
-                            patient_id,
-                            study_date,
-                            modality,
-                            server,
-                            lookup_servers=lookup_servers,
-                            alt_modalities=alt_modalities
-                        )
+                        queries.append((patient_id, study_date, modality, server))
+
+            self.run_queries(queries, lookup_servers=lookup_servers, alt_modalities=alt_modalities)
 
         except Exception as e:
             self.logger.error(f"Error processing batch file: {e}")
+        finally:
+            self.release_associations()
+
+    def _begin_study_move(self, study_key):
+        """Return True if study_key was already moved; otherwise claim it.
+
+        A claimed key must be passed to _end_study_move. If another worker
+        is moving the same study, wait for it: a success is shared, a
+        failure lets this caller retry.
+        """
+        while True:
+            with self._results_lock:
+                if study_key in self._moved_studies:
+                    return True
+                pending = self._moving_studies.get(study_key)
+                if pending is None:
+                    self._moving_studies[study_key] = threading.Event()
+                    return False
+            pending.wait()
+
+    def _end_study_move(self, study_key, moved):
+        with self._results_lock:
+            if moved:
+                self._moved_studies.add(study_key)
+            pending = self._moving_studies.pop(study_key)
+        pending.set()
+
+    def run_queries(
+        self,
+        queries,
+        lookup_servers: Optional[List[str]] = None,
+        alt_modalities: Optional[List[str]] = None
+    ):
+        """Run (patient_id, study_date, modality, server) queries, max_parallel at a time"""
+        def run(query):
+            patient_id, study_date, modality, server = query
+            return self.process_query_with_inline_server(
+                patient_id,
+                study_date,
+                modality,
+                server,
+                lookup_servers=lookup_servers,
+                alt_modalities=alt_modalities
+            )
+
+        workers = min(self._max_parallel(), len(queries))
+        if workers <= 1:
+            for query in queries:
+                run(query)
+            return
+
+        self.logger.info(f"Running {len(queries)} queries with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run, queries))
 
     def generate_report(self):
-        """Generate failure report"""
-        report_file = f"dicom_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        """Generate failure report (.txt), plus the raw records as a .json sidecar"""
+        # Not the run stamp: --serve writes one report per batch
+        now = datetime.now()
+        report_file = f"dicom_report_{now.strftime('%Y%m%d_%H%M%S')}.txt"
+
+        # Build the report in memory and write it in one call
+        parts = []
+        append = parts.append
+        append(REPORT_BAR)
+        append("DICOM DOWNLOAD REPORT\n")
+        append(f"Generated: {now.isoformat()}\n")
+        append(REPORT_BAR + "\n")
+
+        # Summary
+        total = len(self.successful_downloads) + len(self.failed_downloads)
+        if total > 0:
+            success_rate = (len(self.successful_downloads) / total) * 100
+            append(f"Total Queries: {total}\n")
+            append(f"Successful: {len(self.successful_downloads)}\n")
+            append(f"Failed: {len(self.failed_downloads)}\n")
+            append(f"Success Rate: {success_rate:.1f}%\n")
+            append(f"Total C-MOVE Requests: {len(self.move_requests)}\n\n")
+
+            # Get storage path from config
+            storage_path = self.config.get('move_destination', {}).get('storage_path', 'Unknown')
+            destination_ae = self.config.get('move_destination', {}).get('ae_title', 'Unknown')
+
+            append(f"NOTE: Studies are sent to AE Title '{destination_ae}'\n")
+            append(f"      Storage location: {storage_path}\n\n")
+
+        # Failed downloads
+        if self.failed_downloads:
+            append("FAILED DOWNLOADS:\n")
+            append(REPORT_RULE)
+            for i, failure in enumerate(self.failed_downloads, 1):
+                append(
+                    f"\n{i}. Patient: {failure['patient_id']}, "
+                    f"Date: {failure['date']}, "
+                    f"Modality: {failure['modality']}, "
+                    f"Server: {failure['server']}\n"
+                    f"   Reason: {failure['reason']}\n"
+                    f"   Time: {format_timestamp(failure['timestamp'])}\n"
+                )
+
+        # Successful downloads
+        if self.successful_downloads:
+            append("\n\nSUCCESSFUL DOWNLOADS:\n")
+            append(REPORT_RULE)
+            for i, success in enumerate(self.successful_downloads, 1):
+                append(
+                    f"\n{i}. Patient: {success['patient_id']}, "
+                    f"Date: {success['date']}, "
+                    f"Modality: {success['modality']}, "
+                    f"Server: {success['server']}\n"
+                    f"   Studies: {', '.join(success.get('studies', []))}\n"
+                    f"   Time: {format_timestamp(success['timestamp'])}\n"
+                )
 
         with open(report_file, 'w') as f:
-            f.write("=" * 50 + "\n")
-            f.write("DICOM DOWNLOAD REPORT\n")
-            f.write(f"Generated: {datetime.now().isoformat()}\n")
-            f.write("=" * 50 + "\n\n")
-
-            # Summary
-            total = len(self.successful_downloads) + len(self.failed_downloads)
-            if total > 0:
-                success_rate = (len(self.successful_downloads) / total) * 100
-                f.write(f"Total Queries: {total}\n")
-                f.write(f"Successful: {len(self.successful_downloads)}\n")
-                f.write(f"Failed: {len(self.failed_downloads)}\n")
-                f.write(f"Success Rate: {success_rate:.1f}%\n")
-                f.write(f"Total C-MOVE Requests: {len(self.move_requests)}\n\n")
-
-                # Get storage path from config
-                storage_path = self.config.get('move_destination', {}).get('storage_path', 'Unknown')
-                destination_ae = self.config.get('move_destination', {}).get('ae_title', 'Unknown')
-
-                f.write(f"NOTE: Studies are sent to AE Title '{destination_ae}'\n")
-                f.write(f"      Storage location: {storage_path}\n\n")
-
-            # Failed downloads
-            if self.failed_downloads:
-                f.write("FAILED DOWNLOADS:\n")
-                f.write("-" * 50 + "\n")
-                for i, failure in enumerate(self.failed_downloads, 1):
-                    f.write(f"\n{i}. Patient: {failure['patient_id']}, ")
-                    f.write(f"Date: {failure['date']}, ")
-                    f.write(f"Modality: {failure['modality']}, ")
-                    f.write(f"Server: {failure['server']}\n")
-                    f.write(f"   Reason: {failure['reason']}\n")
-                    f.write(f"   Time: {failure['timestamp']}\n")
-
-            # Successful downloads
-            if self.successful_downloads:
-                f.write("\n\nSUCCESSFUL DOWNLOADS:\n")
-                f.write("-" * 50 + "\n")
-                for i, success in enumerate(self.successful_downloads, 1):
-                    f.write(f"\n{i}. Patient: {success['patient_id']}, ")
-                    f.write(f"Date: {success['date']}, ")
-                    f.write(f"Modality: {success['modality']}, ")
-                    f.write(f"Server: {success['server']}\n")
-                    f.write(f"   Studies: {', '.join(success.get('studies', []))}\n")
-                    f.write(f"   Time: {success['timestamp']}\n")
+            f.write(''.join(parts))
+
+        # Same records for tooling; timestamps are Unix time
+        json_file = f"{report_file[:-len('.txt')]}.json"
+        try:
+            dump_json_file(json_file, {
+                'generated': now.isoformat(),
+                'failures': self.failed_downloads,
+                'successes': self.successful_downloads,
+                'moves': self.move_requests
+            })
+        except Exception as e:
+            self.logger.warning(f"Could not write JSON report {json_file}: {e}")
 
         self.logger.info(f"Report saved to: {report_file}")
         return report_file
 
+    def serve_batches(
+        self,
+        lookup_servers: Optional[List[str]] = None,
+        alt_modalities: Optional[List[str]] = None
+    ):
+        """Process batch CSVs sent as JSON lines on stdin until EOF.
+
+        Used by batch_transfer_wrapper --worker-mode so one process (and one
+        pynetdicom import) serves every batch. Each request is
+        {"batch": "<csv path>"}; each result is written to stdout as a line
+        starting with SERVE_RESULT_PREFIX followed by {"batch": ..., "rc": ...}.
+        """
+        sys.stdout.reconfigure(line_buffering=True)
+        print(f"{SERVE_RESULT_PREFIX}{json.dumps({'ready': True})}")
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            rc = 0
+            batch_file = None
+            try:
+                batch_file = json.loads(line)['batch']
+                self.failed_downloads = []
+                self.successful_downloads = []
+                self.move_requests = []
+                # Each batch is zipped on its own, so don't skip studies an
+                # earlier batch moved (per-process mode would move them again)
+                self._moved_studies = set()
+                self._moving_studies = {}
+                self.process_batch(
+                    batch_file,
+                    lookup_servers=lookup_servers,
+                    alt_modalities=alt_modalities
+                )
+                if self.failed_downloads or self.successful_downloads:
+                    report_file = self.generate_report()
+                    print(f"\nReport saved to: {report_file}")
+            except Exception as e:
+                self.logger.error(f"Error serving batch request {line!r}: {e}")
+                rc = 1
+            print(f"{SERVE_RESULT_PREFIX}{json.dumps({'batch': batch_file, 'rc': rc})}")
+
     def parse_server_info(self, server_string):
         """Parse server information from various text formats"""
         server_info = {}
 
         # Remove extra whitespace and normalize
-        server_string = ' '.join(server_string.split())
+        server_string = WHITESPACE_RE.sub(' ', server_string).strip()
 
-        # Pattern 1: "Name: Host 10.x.x.x AE Title XXX Port 104"
-        pattern1 = r'(?:Host|IP)[:\s]+([0-9.]+).*?(?:AE|Title)[:\s]+([\w]+).*?Port[:\s]+(\d+)'
-
-        # Pattern 2: "10.x.x.x XXX 104" (IP, AE Title, Port)
-        pattern2 = r'^([0-9.]+)\s+([\w]+)\s+(\d+)$'
-
-        # Pattern 3: Key-value pairs
-        pattern3 = r'(ip|host|ae_title|aetitle|port)[:\s]+([\w.]+)'
-
-        # Try pattern 1
-        match = re.search(pattern1, server_string, re.IGNORECASE)
+        match = SERVER_INFO_RE.search(server_string)
         if match:
-            server_info['ip'] = match.group(1)
-            server_info['ae_title'] = match.group(2)
-            server_info['port'] = int(match.group(3))
-            return server_info
-
-        # Try pattern 2
-        match = re.match(pattern2, server_string.strip())
-        if match:
-            server_info['ip'] = match.group(1)
-            server_info['ae_title'] = match.group(2)
-            server_info['port'] = int(match.group(3))
+            if match.group(1):
+                ip, ae_title, port = match.group(1, 2, 3)
+            else:
+                ip, ae_title, port = match.group(4, 5, 6)
+            server_info['ip'] = ip
+            server_info['ae_title'] = ae_title
+            server_info['port'] = int(port)
             return server_info
 
-        # Try pattern 3 (key-value pairs)
-        matches = re.findall(pattern3, server_string, re.IGNORECASE)
+        # Try key-value pairs
+        matches = SERVER_KEY_VALUE_RE.findall(server_string)
         if matches:
             for key, value in matches:
                 key = key.lower()
@@ -671,35 +1208,36 @@ class DICOMDownloader:
         return server_info if all(k in server_info for k in ['ip', 'ae_title', 'port']) else None
 
     def add_server(self, name, server_info, save=True):
-        """Add a new server configuration"""
-        # Add to current config
-        self.config['servers'][name] = {
+        """Add a new server configuration; returns its config dict"""
+        # A fresh dict every time, never mutated, so callers can hold on to it
+        server_config = {
             'port': server_info['port'],
             'ip': server_info['ip'],
             'ae_title': server_info['ae_title'],
             'description': server_info.get('description', f'{name} PACS Server')
         }
-
+        with self._servers_lock:
+            is_new = name not in self.config['servers']
+            # Add to current config
+            self.config['servers'][name] = server_config
+            if is_new:
+                self._build_server_index()
+
+            if save:
+                # Written to additional_servers.json by flush_additional_servers()
+                self._additional_servers[name] = server_config
+                self._additional_servers_dirty = True
         if save:
-            # Save to additional servers file
-            additional_servers_file = Path('additional_servers.json')
-            additional_servers = {}
-
-            if additional_servers_file.exists():
-                try:
-                    with open(additional_servers_file, 'r') as f:
-                        additional_servers = json.load(f)
-                except:
-                    pass
-
-            additional_servers[name] = self.config['servers'][name]
-
-            with open(additional_servers_file, 'w') as f:
-                json.dump(additional_servers, f, indent=2)
-
             self.logger.info(f"Added server '{name}' to configuration")
 
-        return True
+        return server_config
+
+    def flush_additional_servers(self):
+        """Write servers added with save=True to additional_servers.json"""
+        if not self._additional_servers_dirty:
+            return
+        dump_json_file(Path('additional_servers.json'), self._additional_servers)
+        self._additional_servers_dirty = False
 
     def process_query_with_inline_server(
         self,
@@ -710,8 +1248,14 @@ class DICOMDownloader:
         lookup_servers: Optional[List[str]] = None,
         alt_modalities: Optional[List[str]] = None
     ):
-        """Process query with inline server specification"""
+        """Process query with inline server specification
+
+        An inline server is registered in config['servers'], but this row
+        queries the endpoint it gave even if a parallel row re-registers the
+        same name with another one.
+        """
         server_name = None
+        inline_servers = None
         if server_spec:
             # Check if server_spec contains inline server info (has | separator)
             if '|' in server_spec:
@@ -724,7 +1268,7 @@ class DICOMDownloader:
                         'port': int(parts[3].strip())
                     }
                     # Add server temporarily (don't save)
-                    self.add_server(server_name, server_info, save=False)
+                    inline_servers = {server_name: self.add_server(server_name, server_info, save=False)}
             else:
                 server_name = server_spec.strip()
 
@@ -734,7 +1278,8 @@ class DICOMDownloader:
             modality,
             server_name,
             lookup_servers=lookup_servers,
-            alt_modalities=alt_modalities
+            alt_modalities=alt_modalities,
+            inline_servers=inline_servers
         )
 
 
@@ -761,6 +1306,11 @@ def main():
     parser.add_argument('--add-server', help='Add server (format: "Name:IP:AETitle:Port" or paste server info)')
     parser.add_argument('--list-servers', action='store_true', help='List all configured servers')
     parser.add_argument('--parse-servers', help='Parse servers from text file')
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Read batch CSV requests from stdin (used by batch_transfer_wrapper --worker-mode)'
+    )
 
     args = parser.parse_args()
 
@@ -779,14 +1329,16 @@ def main():
 
     # Handle server management commands
     if args.list_servers:
-        print("\nConfigured DICOM Servers:")
-        print("=" * 60)
+        lines = ["\nConfigured DICOM Servers:", "=" * 60]
         for name, config in downloader.config['servers'].items():
-            print(f"\n{name}:")
-            print(f"  IP: {config['ip']}")
-            print(f"  AE Title: {config['ae_title']}")
-            print(f"  Port: {config['port']}")
-            print(f"  Description: {config.get('description', 'N/A')}")
+            lines.append(
+                f"\n{name}:\n"
+                f"  IP: {config['ip']}\n"
+                f"  AE Title: {config['ae_title']}\n"
+                f"  Port: {config['port']}\n"
+                f"  Description: {config.get('description', 'N/A')}"
+            )
+        sys.stdout.write("\n".join(lines) + "\n")
         sys.exit(0)
 
     if args.add_server:
@@ -810,107 +1362,161 @@ def main():
             name = input("Enter server name: ").strip()
 
         if downloader.add_server(name, server_info):
+            downloader.flush_additional_servers()
             print(f"Successfully added server '{name}'")
         sys.exit(0)
 
     if args.parse_servers:
         # Parse servers from text file
         try:
-            with open(args.parse_servers, 'r') as f:
-                content = f.read()
+            servers_added = 0
+            # (line, server_info) for servers without a name prefix,
+            # prompted for after the file is read
+            pending_unnamed = []
 
             # Try to parse each line as a server
-            lines = content.strip().split('\n')
-            servers_added = 0
+            with open(args.parse_servers, 'r') as f:
+                for line in f:
+                    line = line.rstrip()
+                    if not line.strip() or line.startswith('#'):
+                        continue
 
-            for line in lines:
-                if not line.strip() or line.startswith('#'):
-                    continue
+                    # Check if line has server name at the beginning
+                    if ':' in line or 'Host' in line or SERVER_LINE_PREFIX_RE.match(line):
+                        # Extract server name if present
+                        name_match = SERVER_LINE_NAME_RE.match(line)
+                        if not name_match:
+                            server_info = downloader.parse_server_info(line)
+                            if server_info:
+                                pending_unnamed.append((line, server_info))
+                            continue
 
-                # Check if line has server name at the beginning
-                if ':' in line or 'Host' in line or re.match(r'^[A-Z]{2}\s', line):
-                    # Extract server name if present
-                    name_match = re.match(r'^([A-Z]{2,})\s*[:]*\s*(.+)$', line)
-                    if name_match:
                         name = name_match.group(1)
-                        server_string = name_match.group(2)
-                    else:
-                        server_string = line
-                        name = input(f"Enter name for server ({line[:30]}...): ").strip()
-
-                    server_info = downloader.parse_server_info(server_string)
-                    if server_info:
-                        downloader.add_server(name, server_info)
-                        servers_added += 1
-                        print(f"Added server '{name}'")
+                        server_info = downloader.parse_server_info(name_match.group(2))
+                        if server_info:
+                            downloader.add_server(name, server_info)
+                            servers_added += 1
+                            print(f"Added server '{name}'")
+
+            if pending_unnamed:
+                print(f"\n{len(pending_unnamed)} server line(s) have no name:")
+                for line, server_info in pending_unnamed:
+                    name = input(f"Enter name for server ({line[:30]}...): ").strip()
+                    if not name:
+                        print("Skipped (no name given)")
+                        continue
+                    downloader.add_server(name, server_info)
+                    servers_added += 1
+                    print(f"Added server '{name}'")
 
             print(f"\nSuccessfully added {servers_added} servers")
         except Exception as e:
             print(f"Error parsing servers file: {e}")
+        finally:
+            # Keep whatever was added before an error or Ctrl+C
+            downloader.flush_additional_servers()
         sys.exit(0)
 
-    # Process queries
-    if args.batch:
-        downloader.process_batch(
-            args.batch,
-            lookup_servers=args.lookup,
-            alt_modalities=args.alt_modality
-        )
-    elif args.id and args.date and args.modality and (args.server or args.lookup):
-        downloader.process_query_with_lookup(
-            args.id,
-            args.date,
-            args.modality,
-            args.server,
-            lookup_servers=args.lookup,
-            alt_modalities=args.alt_modality
-        )
-    else:
-        # Interactive mode
-        print("\n" + "=" * 50)
-        print("DICOM DOWNLOAD TOOL - Interactive Mode")
-        print("=" * 50)
-        print("\nAvailable servers:")
-        for name, config in downloader.config['servers'].items():
-            print(f"  {name}: {config['description']}")
-
-        print("\nEnter query details (or 'quit' to exit):")
-        if args.lookup:
-            print(f"Lookup enabled (servers): {', '.join(args.lookup)}")
-        if args.alt_modality:
-            print(f"Lookup enabled (modalities): {', '.join(args.alt_modality)}")
+    downloader.start_storage_scp()
+    try:
+        if args.serve:
+            downloader.serve_batches(
+                lookup_servers=args.lookup,
+                alt_modalities=args.alt_modality
+            )
+            sys.exit(0)
+
+        # Process queries
+        if args.batch:
+            downloader.process_batch(
+                args.batch,
+                lookup_servers=args.lookup,
+                alt_modalities=args.alt_modality
+            )
+        elif args.id and args.date and args.modality and (args.server or args.lookup):
+            downloader.process_query_with_lookup(
+                args.id,
+                args.date,
+                args.modality,
+                args.server,
+                lookup_servers=args.lookup,
+                alt_modalities=args.alt_modality
+            )
+            downloader.release_associations()
+            downloader.clear_find_cache()
+        else:
+            # Interactive mode
+            print("\n" + "=" * 50)
+            print("DICOM DOWNLOAD TOOL - Interactive Mode")
+            print("=" * 50)
+            print("\nAvailable servers:")
+            for name, config in downloader.config['servers'].items():
+                print(f"  {name}: {config['description']}")
 
-        while True:
             try:
-                patient_id = input("\nPatient ID: ").strip()
-                if patient_id.lower() == 'quit':
-                    break
-
-                study_date = input("Study Date (YYYY-MM-DD): ").strip()
-                modality = input("Modality (CT/MR/MG/etc.): ").strip().upper()
-                server = input("Server name: ").strip()
-                if not server:
-                    if not args.lookup:
-                        print("Server name is required unless --lookup is specified.")
-                        continue
-                    server = None
-
-                downloader.process_query_with_lookup(
-                    patient_id,
-                    study_date,
-                    modality,
-                    server,
-                    lookup_servers=args.lookup,
-                    alt_modalities=args.alt_modality
-                )
-
-                another = input("\nProcess another query? (y/n): ").strip().lower()
-                if another != 'y':
+                import readline  # noqa: F401 - line editing and history for input()
+            except ImportError:
+                pass  # Not available on Windows; the console keeps its own history
+
+            print("\nEnter query details (or 'quit' to exit):")
+            print("Tip: enter 'PID YYYY-MM-DD MODALITY [SERVER]' on one line to skip the prompts")
+            if args.lookup:
+                print(f"Lookup enabled (servers): {', '.join(args.lookup)}")
+            if args.alt_modality:
+                print(f"Lookup enabled (modalities): {', '.join(args.alt_modality)}")
+
+            while True:
+                try:
+                    patient_id = input("\nPatient ID: ").strip()
+                    if patient_id.lower() == 'quit':
+                        break
+
+                    fields = patient_id.split()
+                    if len(fields) > 1:
+                        # One-line query: PID date modality [server]
+                        try:
+                            fields = shlex.split(patient_id)
+                        except ValueError as e:
+                            print(f"Could not parse query line: {e}")
+                            continue
+                        if len(fields) not in (3, 4):
+                            print("One-line query format: PID YYYY-MM-DD MODALITY [SERVER]")
+                            continue
+                        patient_id, study_date, modality = fields[:3]
+                        modality = modality.upper()
+                        server = fields[3] if len(fields) == 4 else ''
+                    else:
+                        study_date = input("Study Date (YYYY-MM-DD): ").strip()
+                        modality = input("Modality (CT/MR/MG/etc.): ").strip().upper()
+                        server = input("Server name: ").strip()
+                    if not server:
+                        if not args.lookup:
+                            print("Server name is required unless --lookup is specified.")
+                            continue
+                        server = None
+
+                    downloader.process_query_with_lookup(
+                        patient_id,
+                        study_date,
+                        modality,
+                        server,
+                        lookup_servers=args.lookup,
+                        alt_modalities=args.alt_modality
+                    )
+                    # Don't hold the association open while waiting on input,
+                    # and let a retried query ask the PACS again
+                    downloader.release_associations()
+                    downloader.clear_find_cache()
+
+                    another = input("\nProcess another query? (y/n): ").strip().lower()
+                    if another != 'y':
+                        break
+
+                except KeyboardInterrupt:
+                    print("\n\nInterrupted by user")
                     break
-
-            except KeyboardInterrupt:
-                print("\n\nInterrupted by user")
-                break
+    finally:
+        downloader.stop_storage_scp()
 
     # Generate report
     if downloader.failed_downloads or downloader.successful_downloads:
@@ -4,10 +4,21 @@ DICOM Network Probe
 Scans and tests DICOM nodes to discover their AE Titles and capabilities
 """
 
+import os
 import sys
+import argparse
+import json
+import errno
 import socket
+import ipaddress
+import itertools
 import logging
+import selectors
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from pathlib import Path
 from pynetdicom import AE, evt, VerificationPresentationContexts
 from pynetdicom.sop_class import (
     Verification,
@@ -42,11 +53,67 @@ COMMON_AE_TITLES = [
 # Common ports to scan
 COMMON_PORTS = [104, 4100, 11112, 11120, 4242]
 
-def test_echo(host, port, calling_ae, called_ae, timeout=3):
+# Calling AE Title tried first against every called AE; most SCPs accept
+# any calling AE once the called AE matches
+GENERIC_CALLING_AE = 'ANY-SCU'
+
+# Calling AE Titles tried only on called AEs that reject the generic one
+CALLING_AE_TITLES = ['GEPACS', 'LQC6', 'SCU']
+
+# A-ASSOCIATE-RJ reason (service-user source): calling AE not recognised
+REJECT_CALLING_AE_NOT_RECOGNISED = 0x03
+
+# Concurrent TCP connects during a network scan
+MAX_PARALLEL_CONNECTIONS = 128
+
+# Concurrent C-ECHO attempts against a single node; kept low so the
+# scan does not exhaust the remote end's association limit
+MAX_PARALLEL_ECHOES = 4
+
+# Working AE pairs from earlier scans, keyed by "ip:port"
+PROBE_CACHE_PATH = Path.home() / '.cache' / 'fudownload' / 'probe-cache.json'
+PROBE_CACHE_VERSION = 1
+PROBE_CACHE_TTL = 24 * 3600
+
+# One Verification-only AE per calling AE Title and timeout set, shared by
+# every probe; pynetdicom copies the AE timeouts into each association
+_AE_CACHE = {}
+_AE_CACHE_LOCK = threading.Lock()
+
+def get_echo_ae(calling_ae, timeout=3, acse_timeout=None, dimse_timeout=None):
+    """Return the cached AE used to send C-ECHO as calling_ae
+
+    timeout bounds the TCP connect and any network silence; acse_timeout
+    and dimse_timeout default to it when not given.
+    """
+    acse_timeout = timeout if acse_timeout is None else acse_timeout
+    dimse_timeout = timeout if dimse_timeout is None else dimse_timeout
+    key = (calling_ae, timeout, acse_timeout, dimse_timeout)
+    with _AE_CACHE_LOCK:
+        ae = _AE_CACHE.get(key)
+        if ae is None:
+            ae = AE(ae_title=calling_ae)
+            ae.add_requested_context(Verification)
+            ae.connection_timeout = timeout
+            ae.network_timeout = timeout
+            ae.acse_timeout = acse_timeout
+            ae.dimse_timeout = dimse_timeout
+            _AE_CACHE[key] = ae
+        return ae
+
+def test_echo(host, port, calling_ae, called_ae, timeout=3, acse_timeout=None, dimse_timeout=None):
     """Test C-ECHO to a DICOM node"""
+    success, message, _ = echo_node(host, port, calling_ae, called_ae, timeout, acse_timeout, dimse_timeout)
+    return success, message
+
+def echo_node(host, port, calling_ae, called_ae, timeout=3, acse_timeout=None, dimse_timeout=None):
+    """Test C-ECHO to a DICOM node; returns (success, message, calling_rejected)
+
+    calling_rejected is True when the node turned the association down
+    because it does not know calling_ae, i.e. another calling AE may work.
+    """
     try:
-        ae = AE(ae_title=calling_ae)
-        ae.add_requested_context(Verification)
+        ae = get_echo_ae(calling_ae, timeout, acse_timeout, dimse_timeout)
 
         assoc = ae.associate(host, port, ae_title=called_ae, max_pdu=0)
 
@@ -56,38 +123,212 @@ def test_echo(host, port, calling_ae, called_ae, timeout=3):
             assoc.release()
 
             if status and status.Status == 0x0000:
-                return True, "C-ECHO successful"
+                return True, "C-ECHO successful", False
             else:
-                return False, f"C-ECHO failed with status: {status.Status if status else 'No status'}"
+                return False, f"C-ECHO failed with status: {status.Status if status else 'No status'}", False
         else:
-            return False, "Association rejected"
+            rsp = assoc.acceptor.primitive
+            calling_rejected = (
+                assoc.is_rejected
+                and rsp is not None
+                and rsp.result_source == 0x01
+                and rsp.diagnostic == REJECT_CALLING_AE_NOT_RECOGNISED
+            )
+            return False, "Association rejected", calling_rejected
 
     except socket.timeout:
-        return False, "Connection timeout"
+        return False, "Connection timeout", False
     except socket.error as e:
-        return False, f"Socket error: {e}"
+        return False, f"Socket error: {e}", False
     except Exception as e:
-        return False, f"Error: {e}"
+        return False, f"Error: {e}", False
+
+def probe_port(target):
+    """TCP connect check for one (ip, port); returns (target, is_open)"""
+    try:
+        with socket.create_connection(target, timeout=0.5):
+            return target, True
+    except ConnectionRefusedError:
+        # Refused straight away: the host is up, only this port is closed
+        logger.debug(f"Port closed: {target[0]}:{target[1]}")
+        return target, False
+    except OSError:
+        return target, False
+
+def find_open_ports(host, ports, timeout=0.5):
+    """Connect to all ports at once and return the ones that accept, in order
+
+    Every connect is issued non-blocking and a single selector waits on
+    them together, so the check takes one timeout rather than one per port.
+    """
+    sel = selectors.DefaultSelector()
+    open_ports = set()
+    try:
+        for port in ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            err = sock.connect_ex((host, port))
+            if err in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sel.register(sock, selectors.EVENT_WRITE, port)
+                continue
+            if err == 0:
+                open_ports.add(port)
+            sock.close()
 
-def scan_local_network(base_ip=None):
+        deadline = time.monotonic() + timeout
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in sel.select(remaining):
+                sock = key.fileobj
+                if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    open_ports.add(key.data)
+                sel.unregister(sock)
+                sock.close()
+    finally:
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
+
+    return [port for port in ports if port in open_ports]
+
+def ae_candidates(called_aes=COMMON_AE_TITLES, calling_aes=CALLING_AE_TITLES):
+    """Yield (called_ae, calling_ae) pairs in the order they should be tried"""
+    for called_ae in called_aes:
+        for calling_ae in calling_aes:
+            yield called_ae, calling_ae
+
+def find_working_ae(ip, port, max_parallel=MAX_PARALLEL_ECHOES, acse_timeout=None, dimse_timeout=None):
+    """Return the first (called_ae, calling_ae, message) that answers C-ECHO, or None"""
+    # First pass: every called AE with the generic calling AE
+    rejected = set()
+    found = _first_working_ae(
+        ip, port, ae_candidates(COMMON_AE_TITLES, [GENERIC_CALLING_AE]), rejected,
+        max_parallel, acse_timeout, dimse_timeout
+    )
+
+    # Only called AEs that refused the generic calling AE get the full list
+    if not found and rejected:
+        retry = [called_ae for called_ae in COMMON_AE_TITLES if called_ae in rejected]
+        found = _first_working_ae(
+            ip, port, ae_candidates(retry, CALLING_AE_TITLES), set(),
+            max_parallel, acse_timeout, dimse_timeout
+        )
+
+    return found
+
+def _first_working_ae(ip, port, candidates, rejected, max_parallel, acse_timeout, dimse_timeout):
+    """Echo candidates until one succeeds; called AEs refusing the calling AE go into rejected"""
+    executor = ThreadPoolExecutor(max_workers=max(1, max_parallel))
+    pending = {}
+    found = None
+    try:
+        # Keep max_parallel echoes in flight and feed the next pair as each
+        # one fails, so nothing past the first success is ever submitted
+        for called_ae, calling_ae in candidates:
+            future = executor.submit(
+                echo_node, ip, port, calling_ae, called_ae,
+                timeout=2, acse_timeout=acse_timeout, dimse_timeout=dimse_timeout
+            )
+            pending[future] = (called_ae, calling_ae)
+            if len(pending) < max_parallel:
+                continue
+            found = _collect_echo(pending, rejected)
+            if found:
+                break
+
+        while pending and not found:
+            found = _collect_echo(pending, rejected)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    return found
+
+def _collect_echo(pending, rejected):
+    """Wait for at least one echo in pending to finish; return its success, if any"""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    found = None
+    for future in done:
+        called_ae, calling_ae = pending.pop(future)
+        success, message, calling_rejected = future.result()
+        if success and not found:
+            found = (called_ae, calling_ae, message)
+        elif calling_rejected:
+            rejected.add(called_ae)
+    return found
+
+def load_probe_cache(path=PROBE_CACHE_PATH, ttl=PROBE_CACHE_TTL):
+    """Load cached scan results, dropping entries older than ttl seconds"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable probe cache {path}: {e}")
+        return {}
+
+    if not isinstance(data, dict) or data.get('version') != PROBE_CACHE_VERSION:
+        return {}
+
+    cutoff = time.time() - ttl
+    return {
+        key: entry for key, entry in data.get('nodes', {}).items()
+        if entry.get('success') and entry.get('last_seen', 0) >= cutoff
+    }
+
+def save_probe_cache(nodes, path=PROBE_CACHE_PATH):
+    """Atomically write scan results to the probe cache (mode 0600)"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    data = {'version': PROBE_CACHE_VERSION, 'ttl_seconds': PROBE_CACHE_TTL, 'nodes': nodes}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write probe cache {path}: {e}")
+
+def scan_blocks(network):
+    """Split network into /24 blocks of host addresses (as strings)
+
+    Blocks are swept one after another so a /16 never has all of its
+    targets queued at once.
+    """
+    if network.prefixlen >= 24:
+        yield [str(ip) for ip in network.hosts()]
+        return
+
+    # Inner .0/.255 addresses are ordinary hosts in a wider network
+    edges = (network.network_address, network.broadcast_address)
+    for block in network.subnets(new_prefix=24):
+        yield [str(ip) for ip in block if ip not in edges]
+
+def scan_local_network(base_ip=None, max_parallel=MAX_PARALLEL_CONNECTIONS, acse_timeout=None,
+                       dimse_timeout=None, cidr=None):
     """Scan local network for DICOM nodes"""
     results = []
 
-    # Get local IP if not provided
-    if not base_ip:
-        try:
-            hostname = socket.gethostname()
-            local_ip = socket.gethostbyname(hostname)
-            base_ip = '.'.join(local_ip.split('.')[:-1])
-            logger.info(f"Scanning network: {base_ip}.x")
-        except:
-            base_ip = "192.168.1"
-            logger.warning(f"Could not detect local network, using default: {base_ip}.x")
-
-    # Common IP ranges for DICOM servers
-    ip_ranges = [
-        f"{base_ip}.{i}" for i in range(1, 255)
-    ]
+    if cidr:
+        network = ipaddress.ip_network(cidr, strict=False)
+        logger.info(f"Scanning network: {network}")
+    else:
+        # Get local IP if not provided
+        if not base_ip:
+            try:
+                hostname = socket.gethostname()
+                local_ip = socket.gethostbyname(hostname)
+                base_ip = '.'.join(local_ip.split('.')[:-1])
+                logger.info(f"Scanning network: {base_ip}.x")
+            except:
+                base_ip = "192.168.1"
+                logger.warning(f"Could not detect local network, using default: {base_ip}.x")
+        network = ipaddress.ip_network(f"{base_ip}.0/24")
 
     # Add specific IPs from config if available
     known_ips = [
@@ -97,48 +338,73 @@ def scan_local_network(base_ip=None):
         "10.31.191.52",   # TY LTA
         "127.0.0.1"       # Localhost
     ]
-
-    for ip in known_ips:
-        if ip not in ip_ranges:
-            ip_ranges.append(ip)
-
-    logger.info(f"Testing {len(ip_ranges)} IP addresses with {len(COMMON_PORTS)} ports each...")
-
-    for ip in ip_ranges:
-        for port in COMMON_PORTS:
-            # Quick port scan first
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
-            result = sock.connect_ex((ip, port))
-            sock.close()
-
-            if result == 0:
-                logger.info(f"Found open port: {ip}:{port}")
-
-                # Try different AE Title combinations
-                for called_ae in COMMON_AE_TITLES:
-                    for calling_ae in ['GEPACS', 'LQC6', 'SCU']:
-                        success, message = test_echo(ip, port, calling_ae, called_ae, timeout=2)
-
-                        if success:
-                            result = {
-                                'ip': ip,
-                                'port': port,
-                                'calling_ae': calling_ae,
-                                'called_ae': called_ae,
-                                'status': 'SUCCESS',
-                                'message': message
-                            }
-                            results.append(result)
-                            logger.info(f"✓ Found DICOM node: {ip}:{port} (Called AE: {called_ae}, Calling AE: {calling_ae})")
-                            break  # Found working combination
-
-                    if results and results[-1]['ip'] == ip and results[-1]['port'] == port:
-                        break  # Already found for this IP:port
+    extra_ips = sorted(
+        {ip for ip in known_ips if ipaddress.ip_address(ip) not in network},
+        key=ipaddress.ip_address
+    )
+
+    host_count = network.num_addresses - (2 if network.prefixlen < 31 else 0) + len(extra_ips)
+    logger.info(f"Testing {host_count} IP addresses with {len(COMMON_PORTS)} ports each...")
+
+    # Quick port scan first: all connects in flight at once, so the sweep
+    # takes about one timeout per max_parallel targets instead of one per target
+    blocks = itertools.chain(scan_blocks(network), [extra_ips])
+    open_targets = []
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        for block in blocks:
+            targets = [(ip, port) for ip in block for port in COMMON_PORTS]
+            for target, is_open in executor.map(probe_port, targets):
+                if is_open:
+                    logger.info(f"Found open port: {target[0]}:{target[1]}")
+                    open_targets.append(target)
+
+    cache = load_probe_cache()
+    try:
+        for ip, port in open_targets:
+            key = f"{ip}:{port}"
+            found = None
+
+            # Re-check the pair that worked last time before the full matrix
+            cached = cache.get(key)
+            if cached:
+                success, message = test_echo(
+                    ip, port, cached['calling_ae'], cached['called_ae'],
+                    timeout=2, acse_timeout=acse_timeout, dimse_timeout=dimse_timeout
+                )
+                if success:
+                    found = (cached['called_ae'], cached['calling_ae'], message)
+
+            # Try different AE Title combinations, stopping at the first that works
+            if not found:
+                found = find_working_ae(ip, port, acse_timeout=acse_timeout, dimse_timeout=dimse_timeout)
+
+            if not found:
+                cache.pop(key, None)
+                continue
+
+            called_ae, calling_ae, message = found
+            cache[key] = {
+                'calling_ae': calling_ae,
+                'called_ae': called_ae,
+                'last_seen': time.time(),
+                'success': True
+            }
+            results.append({
+                'ip': ip,
+                'port': port,
+                'calling_ae': calling_ae,
+                'called_ae': called_ae,
+                'status': 'SUCCESS',
+                'message': message
+            })
+            logger.info(f"✓ Found DICOM node: {ip}:{port} (Called AE: {called_ae}, Calling AE: {calling_ae})")
+    finally:
+        # Keep what was learned even if the scan is interrupted
+        save_probe_cache(cache)
 
     return results
 
-def test_specific_node(ip, port, ae_title=None):
+def test_specific_node(ip, port, ae_title=None, acse_timeout=None, dimse_timeout=None):
     """Test a specific DICOM node with various AE Titles"""
     logger.info(f"\nTesting DICOM node at {ip}:{port}")
     logger.info("=" * 50)
@@ -152,11 +418,18 @@ def test_specific_node(ip, port, ae_title=None):
         # Test all common AE Titles
         ae_titles_to_test = COMMON_AE_TITLES
 
-    for called_ae in ae_titles_to_test:
-        for calling_ae in ['GEPACS', 'LQC6', 'SCU', 'ANY-SCU']:
+    # Try the generic calling AE first; only called AEs that reject it on
+    # calling-AE grounds are retried with the other calling AE Titles
+    candidates = list(ae_candidates(ae_titles_to_test, [GENERIC_CALLING_AE]))
+    retry = []
+    while candidates:
+        for called_ae, calling_ae in candidates:
             logger.info(f"Testing: Calling AE='{calling_ae}' -> Called AE='{called_ae}'")
 
-            success, message = test_echo(ip, port, calling_ae, called_ae)
+            success, message, calling_rejected = echo_node(
+                ip, port, calling_ae, called_ae,
+                acse_timeout=acse_timeout, dimse_timeout=dimse_timeout
+            )
 
             result = {
                 'calling_ae': calling_ae,
@@ -173,6 +446,11 @@ def test_specific_node(ip, port, ae_title=None):
                 logger.info(f"  → Called AE: '{called_ae}'")
             else:
                 logger.debug(f"  ✗ FAILED: {message}")
+                if calling_rejected and calling_ae == GENERIC_CALLING_AE:
+                    retry.append(called_ae)
+
+        candidates = list(ae_candidates(retry, CALLING_AE_TITLES))
+        retry = []
 
     # Summary
     successful = [r for r in results if r['success']]
@@ -185,16 +463,41 @@ def test_specific_node(ip, port, ae_title=None):
 
     return results
 
+def parse_cidr(value):
+    """argparse type for --cidr: an IPv4 network such as 10.30.0.0/16"""
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    if network.version != 4:
+        raise argparse.ArgumentTypeError("only IPv4 networks can be scanned")
+    return network
+
 def main():
     """Main function"""
-    import argparse
-
     parser = argparse.ArgumentParser(description='DICOM Network Probe')
     parser.add_argument('--scan', action='store_true', help='Scan local network for DICOM nodes')
+    parser.add_argument('--cidr', type=parse_cidr, help='Network to scan instead of the local /24 (e.g. 10.30.0.0/16)')
     parser.add_argument('--ip', help='Test specific IP address')
     parser.add_argument('--port', type=int, help='Test specific port')
     parser.add_argument('--ae-title', help='Test specific AE Title')
     parser.add_argument('--calling-ae', help='Use specific calling AE Title')
+    parser.add_argument(
+        '--max-parallel',
+        type=int,
+        default=MAX_PARALLEL_CONNECTIONS,
+        help=f'Concurrent TCP connects during --scan (default: {MAX_PARALLEL_CONNECTIONS})'
+    )
+    parser.add_argument(
+        '--acse-timeout',
+        type=float,
+        help='Seconds to wait for association accept/reject (default: connect timeout)'
+    )
+    parser.add_argument(
+        '--dimse-timeout',
+        type=float,
+        help='Seconds to wait for the C-ECHO response (default: connect timeout)'
+    )
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
 
     args = parser.parse_args()
@@ -210,7 +513,12 @@ def main():
         print("\nScanning local network for DICOM nodes...")
         print("This may take a few minutes...\n")
 
-        results = scan_local_network()
+        results = scan_local_network(
+            max_parallel=args.max_parallel,
+            acse_timeout=args.acse_timeout,
+            dimse_timeout=args.dimse_timeout,
+            cidr=args.cidr
+        )
 
         if results:
             print(f"\n✓ Found {len(results)} DICOM node(s):\n")
@@ -224,7 +532,11 @@ def main():
             print("\n✗ No DICOM nodes found")
 
     elif args.ip and args.port:
-        results = test_specific_node(args.ip, args.port, args.ae_title)
+        results = test_specific_node(
+            args.ip, args.port, args.ae_title,
+            acse_timeout=args.acse_timeout,
+            dimse_timeout=args.dimse_timeout
+        )
 
     elif args.ip or args.port:
         print("Error: Both --ip and --port are required for testing specific node")
@@ -235,16 +547,14 @@ def main():
         print("\nTesting common local DICOM ports...")
         found_any = False
 
-        for port in COMMON_PORTS:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.5)
-            result = sock.connect_ex(('127.0.0.1', port))
-            sock.close()
-
-            if result == 0:
-                print(f"\nFound open port: localhost:{port}")
-                test_specific_node('127.0.0.1', port)
-                found_any = True
+        for port in find_open_ports('127.0.0.1', COMMON_PORTS):
+            print(f"\nFound open port: localhost:{port}")
+            test_specific_node(
+                '127.0.0.1', port,
+                acse_timeout=args.acse_timeout,
+                dimse_timeout=args.dimse_timeout
+            )
+            found_any = True
 
         if not found_any:
             print("\nNo DICOM services found on localhost")
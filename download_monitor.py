@@ -1,9 +1,16 @@
+import asyncio
+import gzip
 import json
 import threading
 import time
-from collections import deque
 from datetime import datetime
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from html import escape
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import orjson  # Optional; not bundled with the embedded Python
+except ImportError:
+    orjson = None
 
 
 MONITOR_TEMPLATE = """<!doctype html>
@@ -264,7 +271,7 @@ MONITOR_TEMPLATE = """<!doctype html>
       <div>
         <div class="eyebrow">Live download</div>
         <h1>FuDownload Monitor</h1>
-        <div class="meta">Auto refresh every 2 seconds</div>
+        <div class="meta">Live updates</div>
       </div>
       <div class="indicator status-pill tone-primary" id="server-status">Starting</div>
     </header>
@@ -340,103 +347,270 @@ MONITOR_TEMPLATE = """<!doctype html>
       node.classList.add(`tone-${tone}`);
     };
 
-    const toneFromStatus = (value) => {
-      const text = (value || "").toLowerCase();
-      if (!text || text === "--") return "neutral";
-      if (text.includes("error") || text.includes("fail")) return "danger";
-      if (text.includes("warn")) return "warning";
-      if (text.includes("success") || text.includes("complete")) return "success";
-      if (text.includes("idle") || text.includes("stop")) return "neutral";
-      return "primary";
+    const pad2 = (n) => String(n).padStart(2, "0");
+    const fmtDuration = (seconds) => {
+      const total = Math.max(0, Math.floor(seconds));
+      const hours = Math.floor(total / 3600);
+      const minutes = Math.floor((total % 3600) / 60);
+      const secs = total % 60;
+      if (hours) return `${pad2(hours)}:${pad2(minutes)}:${pad2(secs)}`;
+      return `${pad2(minutes)}:${pad2(secs)}`;
     };
 
-    const toneFromLevel = (value) => {
-      const text = (value || "").toLowerCase();
-      if (text.includes("error")) return "danger";
-      if (text.includes("warn")) return "warning";
-      if (text.includes("success")) return "success";
-      if (text.includes("debug")) return "neutral";
-      return "info";
-    };
+    // Uptime ticks locally between status responses.
+    let statusEtag = null;
+    let uptimeBase = null;
+    let uptimeAt = 0;
 
-    const fmtPair = (a, b) => {
-      if (a == null || b == null) return "--";
-      return `${a} / ${b}`;
+    const renderUptime = () => {
+      if (uptimeBase == null) return;
+      el("uptime").textContent = fmtDuration(uptimeBase + (Date.now() - uptimeAt) / 1000);
     };
 
     const updateStatus = async () => {
       try {
-        const response = await fetch("/api/status", { cache: "no-store" });
+        // With a known ETag the server holds the request until something
+        // changes (or ~25s pass and it answers 304).
+        const headers = statusEtag ? { "If-None-Match": statusEtag } : {};
+        const url = statusEtag ? "/api/status?wait=25" : "/api/status";
+        const response = await fetch(url, { cache: "no-store", headers });
+        if (response.status === 304) return true;
+        statusEtag = response.headers.get("ETag");
+        // Display strings and tones are prepared server-side.
         const data = await response.json();
-        const progress = data.progress || {};
+        const text = data.text || {};
+        uptimeBase = data.uptime_seconds;
+        uptimeAt = Date.now();
 
-        const serverStatus = data.status || "Running";
-        el("server-status").textContent = serverStatus;
-        applyTone(el("server-status"), toneFromStatus(serverStatus));
+        el("server-status").textContent = data.status || "Running";
+        applyTone(el("server-status"), data.status_tone);
         el("uptime").textContent = data.uptime_human || "--";
         el("start-time").textContent = data.start_time || "--";
 
-        el("csv-progress").textContent = fmtPair(progress.csv_index || 0, progress.csv_total || 0);
+        el("csv-progress").textContent = text.csv_progress;
         el("csv-name").textContent = data.current_csv || "--";
 
-        el("batch-progress").textContent = fmtPair(progress.batches_done || 0, progress.batches_total || 0);
-        el("batch-current").textContent = fmtPair(progress.current_batch || 0, progress.current_batch_total || 0);
+        el("batch-progress").textContent = text.batch_progress;
+        el("batch-current").textContent = text.batch_current;
 
-        el("case-progress").textContent = fmtPair(progress.cases_done || 0, progress.cases_total || 0);
-        const skipped = progress.cases_skipped || 0;
-        const errors = progress.errors || 0;
-        el("case-meta").textContent = `Skipped: ${skipped} | Errors: ${errors}`;
+        el("case-progress").textContent = text.case_progress;
+        el("case-meta").textContent = text.case_meta;
 
-        const mode = data.transfer_mode || "--";
-        const protocol = data.transfer_protocol || "--";
-        el("mode").textContent = `${mode} / ${protocol}`;
+        el("mode").textContent = text.mode;
         el("phase").textContent = `Phase: ${data.phase || "--"}`;
 
         el("current-csv").textContent = data.current_csv || "--";
-        el("current-batch").textContent = fmtPair(progress.current_batch || 0, progress.current_batch_total || 0);
-        el("current-cases").textContent = fmtPair(progress.cases_done || 0, progress.cases_total || 0);
+        el("current-batch").textContent = text.batch_current;
+        el("current-cases").textContent = text.case_progress;
         el("current-phase").textContent = data.phase || "--";
-        const currentStatus = data.status || "--";
-        el("current-status").textContent = currentStatus;
-        applyTone(el("current-status"), toneFromStatus(currentStatus));
+        el("current-status").textContent = data.status || "--";
+        applyTone(el("current-status"), data.status_tone);
 
         const logs = data.recent_logs || [];
         const logList = el("log-list");
         if (!logs.length) {
           logList.innerHTML = "<li class='log-item tone-neutral muted'>No logs yet.</li>";
         } else {
-          logList.innerHTML = logs.slice(0, 8).map((item) => {
-            const ts = item.timestamp || "--";
-            const level = item.level || "INFO";
-            const msg = item.message || "";
-            const tone = toneFromLevel(level);
-            return `<li class="log-item tone-${tone}"><strong>[${ts}] [${level}]</strong> ${msg}</li>`;
-          }).join("");
+          logList.innerHTML = logs.map((item) => item.html).join("");
         }
+        return true;
       } catch (err) {
         console.error("Failed to refresh status", err);
+        statusEtag = null;
+        return false;
       }
     };
 
-    updateStatus();
-    setInterval(updateStatus, 2000);
+    const poll = async () => {
+      const ok = await updateStatus();
+      setTimeout(poll, ok ? 0 : 2000);
+    };
+
+    poll();
+    setInterval(renderUptime, 1000);
   </script>
 </body>
 </html>
 """
 
+MONITOR_TEMPLATE_BYTES = MONITOR_TEMPLATE.encode("utf-8")
+MONITOR_TEMPLATE_LEN = str(len(MONITOR_TEMPLATE_BYTES))
+
+
+def build_response(status, headers, body=b""):
+    """Assemble a complete HTTP/1.1 response so it goes out in one write."""
+    lines = [f"HTTP/1.1 {status}"]
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+INDEX_RESPONSE = build_response("200 OK", [
+    ("Content-Type", "text/html; charset=utf-8"),
+    ("Cache-Control", "no-store"),
+    ("Vary", "Accept-Encoding"),
+    ("Content-Length", MONITOR_TEMPLATE_LEN),
+], MONITOR_TEMPLATE_BYTES)
+
+MONITOR_TEMPLATE_GZIP = gzip.compress(MONITOR_TEMPLATE_BYTES, compresslevel=9, mtime=0)
+INDEX_GZIP_RESPONSE = build_response("200 OK", [
+    ("Content-Type", "text/html; charset=utf-8"),
+    ("Content-Encoding", "gzip"),
+    ("Cache-Control", "no-store"),
+    ("Vary", "Accept-Encoding"),
+    ("Content-Length", len(MONITOR_TEMPLATE_GZIP)),
+], MONITOR_TEMPLATE_GZIP)
+
+NOT_FOUND_RESPONSE = build_response("404 Not Found", [
+    ("Content-Type", "text/plain; charset=utf-8"),
+    ("Cache-Control", "no-store"),
+    ("Content-Length", "9"),
+], b"Not Found")
+
+BAD_REQUEST_RESPONSE = build_response("400 Bad Request", [
+    ("Content-Type", "text/plain; charset=utf-8"),
+    ("Connection", "close"),
+    ("Content-Length", "11"),
+], b"Bad Request")
+
+METHOD_NOT_ALLOWED_RESPONSE = build_response("405 Method Not Allowed", [
+    ("Content-Type", "text/plain; charset=utf-8"),
+    ("Allow", "GET"),
+    ("Connection", "close"),
+    ("Content-Length", "18"),
+], b"Method Not Allowed")
+
+
+def status_response(body, etag, gzipped):
+    headers = [("Content-Type", "application/json; charset=utf-8")]
+    if gzipped:
+        headers.append(("Content-Encoding", "gzip"))
+    headers.extend([
+        ("Cache-Control", "no-store"),
+        ("Vary", "Accept-Encoding"),
+        ("ETag", etag),
+        ("Content-Length", len(body)),
+    ])
+    return build_response("200 OK", headers, body)
+
+
+def not_modified_response(etag):
+    return build_response("304 Not Modified", [
+        ("Cache-Control", "no-store"),
+        ("ETag", etag),
+    ])
+
+
+def wait_seconds(target):
+    """The ?wait=N long-poll time requested in target, capped at STATUS_MAX_WAIT."""
+    query = parse_qs(urlsplit(target).query)
+    try:
+        wait = float(query.get("wait", ["0"])[0])
+    except ValueError:
+        return 0
+    return min(max(wait, 0), STATUS_MAX_WAIT)
+
+# How long an encoded /api/status body may be reused while nothing changes.
+# Only uptime_seconds/uptime_human go stale meanwhile; the page counts
+# uptime itself between long-poll responses.
+STATUS_CACHE_TTL = 0.25
+
+# State keys reported under "progress" in /api/status, in output order.
+PROGRESS_FIELDS = (
+    "csv_index",
+    "csv_total",
+    "batches_total",
+    "batches_done",
+    "current_batch",
+    "current_batch_total",
+    "cases_total",
+    "cases_done",
+    "cases_skipped",
+    "errors",
+)
+
+# Recent log events kept, and how many of them /api/status sends (the
+# page only shows that many).
+LOG_CAPACITY = 200
+STATUS_LOG_LIMIT = 8
+
+# One encoded log event; each field is an already JSON-encoded value.
+LOG_EVENT_TEMPLATE = b'{"timestamp":%b,"level":%b,"message":%b,"tone":%b,"html":%b}'
+
+# Longest a /api/status?wait=N long-poll is held open, in seconds.
+STATUS_MAX_WAIT = 30
+
+# Idle keep-alive connections are closed after this many seconds; longer
+# than the longest long-poll.
+IDLE_TIMEOUT = STATUS_MAX_WAIT * 2
+
+
+def encode_json(obj):
+    """Compact UTF-8 JSON bytes, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def accepts_gzip(accept_encoding):
+    """True if an Accept-Encoding header allows gzip (q=0 refuses it)."""
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
+
+
+def status_tone(value):
+    text = (value or "").lower()
+    if not text or text == "--":
+        return "neutral"
+    if "error" in text or "fail" in text:
+        return "danger"
+    if "warn" in text:
+        return "warning"
+    if "success" in text or "complete" in text:
+        return "success"
+    if "idle" in text or "stop" in text:
+        return "neutral"
+    return "primary"
+
+
+def level_tone(value):
+    text = (value or "").lower()
+    if "error" in text:
+        return "danger"
+    if "warn" in text:
+        return "warning"
+    if "success" in text:
+        return "success"
+    if "debug" in text:
+        return "neutral"
+    return "info"
+
 
 def now_timestamp():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
+# "MM:SS" for every second of an hour; format_duration indexes into it.
+_MMSS_TABLE = tuple(f"{minutes:02d}:{secs:02d}" for minutes in range(60) for secs in range(60))
+
+
 def format_duration(seconds):
     seconds = int(max(seconds, 0))
+    if seconds < 3600:
+        return _MMSS_TABLE[seconds]
     hours, remainder = divmod(seconds, 3600)
-    minutes, secs = divmod(remainder, 60)
-    if hours:
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-    return f"{minutes:02d}:{secs:02d}"
+    return f"{hours:02d}:{_MMSS_TABLE[remainder]}"
 
 
 class DownloadMonitor:
@@ -444,10 +618,34 @@ class DownloadMonitor:
         self.host = host
         self.port = port
         self.enabled = enabled
+        # Serializes writers only; readers take self.state without it.
         self.lock = threading.Lock()
+        # Event loop serving the UI, and the event its long-polls wait on;
+        # replaced by a fresh one each time it fires.
+        self._loop = None
+        self._changed = None
         self.thread = None
         self.running = False
-        self.recent_events = deque(maxlen=200)
+        # time.monotonic() at start(), for uptime; state keeps the wall-clock
+        # start_time as a preformatted string.
+        self._start_monotonic = None
+        # Recent log events, newest first, each pre-encoded as a JSON
+        # object; an immutable tuple replaced whole, so readers need no lock.
+        self._logs = ()
+        # Bumped when update() actually changes a field or an event is
+        # logged; doubles as the /api/status ETag, after a per-process token
+        # so a tab left open across a restart can't match the new counter.
+        self.version = 0
+        self._etag_prefix = f'W/"{time.time_ns():x}-'
+        # Encoded /api/status body and its complete responses (headers
+        # included, gzip variant built on demand), reused while the version
+        # is current and they have not expired.
+        self._cached_body = None
+        self._cached_response = None
+        self._cached_gzip_response = None
+        self._cached_version = -1
+        self._cached_expiry = 0.0
+        # Copy-on-write: never mutated in place, replaced whole by update().
         self.state = {
             "status": "Starting",
             "phase": "idle",
@@ -466,97 +664,169 @@ class DownloadMonitor:
             "cases_skipped": 0,
             "errors": 0,
         }
+        # Encoded "progress" object, redone only when one of its fields changes.
+        self._progress_json = self._encode_progress(self.state)
+
+    @staticmethod
+    def _encode_progress(state):
+        return encode_json({key: state.get(key, 0) for key in PROGRESS_FIELDS})
 
     def update(self, **updates):
         with self.lock:
-            self.state.update(updates)
+            state = self.state
+            changed = {key: value for key, value in updates.items() if state.get(key, state) != value}
+            if changed:
+                new_state = dict(state)
+                new_state.update(changed)
+                self.state = new_state
+                if not changed.keys().isdisjoint(PROGRESS_FIELDS):
+                    self._progress_json = self._encode_progress(new_state)
+                self.version += 1
+        if changed:
+            self._wake_waiters()
 
     def log_event(self, message, level="INFO"):
         timestamp = now_timestamp()
+        tone = level_tone(level)
+        html = (
+            f'<li class="log-item tone-{tone}"><strong>[{timestamp}] '
+            f'[{escape(level or "INFO")}]</strong> {escape(message)}</li>'
+        )
+        # Filled straight from the encoded strings, with no dict per event.
+        fragment = LOG_EVENT_TEMPLATE % (
+            encode_json(timestamp),
+            encode_json(level),
+            encode_json(message),
+            encode_json(tone),
+            encode_json(html),
+        )
         with self.lock:
-            self.recent_events.append({
-                "timestamp": timestamp,
-                "level": level,
-                "message": message,
-            })
+            self._logs = (fragment,) + self._logs[:LOG_CAPACITY - 1]
+            self.version += 1
+        self._wake_waiters()
 
-    def _build_status_payload(self):
-        with self.lock:
-            snapshot = dict(self.state)
-            logs_snapshot = list(self.recent_events)
-
-        start_time = snapshot.get("start_time")
-        if start_time is None:
-            start_time = datetime.now()
-            snapshot["start_time"] = start_time
+    def _recent_log_fragments(self, limit=STATUS_LOG_LIMIT):
+        """Up to limit encoded log events, newest first."""
+        return self._logs[:limit]
 
-        uptime_seconds = (datetime.now() - start_time).total_seconds()
+    def _build_status_payload(self):
+        """Status fields except progress and recent_logs, which are spliced in encoded."""
+        snapshot = self.state
+
+        start_monotonic = self._start_monotonic
+        if start_monotonic is None:
+            start_time = now_timestamp()
+            uptime_seconds = 0
+        else:
+            start_time = snapshot.get("start_time")
+            uptime_seconds = time.monotonic() - start_monotonic
+        status = snapshot.get("status", "Running")
+        get = snapshot.get
 
         return {
-            "status": snapshot.get("status", "Running"),
+            "status": status,
+            "status_tone": status_tone(status),
             "phase": snapshot.get("phase", "idle"),
             "transfer_mode": snapshot.get("transfer_mode"),
             "transfer_protocol": snapshot.get("transfer_protocol"),
             "current_csv": snapshot.get("current_csv"),
-            "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "start_time": start_time,
             "uptime_seconds": int(uptime_seconds),
             "uptime_human": format_duration(uptime_seconds),
-            "progress": {
-                "csv_index": snapshot.get("csv_index", 0),
-                "csv_total": snapshot.get("csv_total", 0),
-                "batches_total": snapshot.get("batches_total", 0),
-                "batches_done": snapshot.get("batches_done", 0),
-                "current_batch": snapshot.get("current_batch", 0),
-                "current_batch_total": snapshot.get("current_batch_total", 0),
-                "cases_total": snapshot.get("cases_total", 0),
-                "cases_done": snapshot.get("cases_done", 0),
-                "cases_skipped": snapshot.get("cases_skipped", 0),
-                "errors": snapshot.get("errors", 0),
+            "text": {
+                "csv_progress": f"{get('csv_index') or 0} / {get('csv_total') or 0}",
+                "batch_progress": f"{get('batches_done') or 0} / {get('batches_total') or 0}",
+                "batch_current": f"{get('current_batch') or 0} / {get('current_batch_total') or 0}",
+                "case_progress": f"{get('cases_done') or 0} / {get('cases_total') or 0}",
+                "case_meta": f"Skipped: {get('cases_skipped') or 0} | Errors: {get('errors') or 0}",
+                "mode": f"{get('transfer_mode') or '--'} / {get('transfer_protocol') or '--'}",
             },
-            "recent_logs": list(reversed(logs_snapshot)),
         }
 
+    def status_etag(self):
+        # Weak: uptime moves on while the version stays put.
+        return f'{self._etag_prefix}{self.version}"'
+
+    def _wake_waiters(self):
+        """Wake long-polls; safe to call from any thread."""
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._fire_changed)
+
+    def _fire_changed(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _wait_for_change(self, etag, timeout):
+        """Wait until status_etag() differs from etag or timeout passes."""
+        deadline = self._loop.time() + timeout
+        while self.status_etag() == etag:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def _get_status_response(self, gzipped=False):
+        """Complete /api/status response bytes, gzip-compressed if asked."""
+        now = time.monotonic()
+        version = self.version
+        etag = f'{self._etag_prefix}{version}"'
+        with self.lock:
+            fresh = self._cached_version == version and now < self._cached_expiry
+            body = self._cached_body
+            response, gzip_response = self._cached_response, self._cached_gzip_response
+
+        if not fresh:
+            head = encode_json(self._build_status_payload())
+            body = b"".join((
+                head[:-1],
+                b',"progress":', self._progress_json,
+                b',"recent_logs":[', b",".join(self._recent_log_fragments()), b"]}",
+            ))
+            response = status_response(body, etag, False)
+            gzip_response = None
+            with self.lock:
+                self._cached_body = body
+                self._cached_response = response
+                self._cached_gzip_response = None
+                self._cached_version = version
+                self._cached_expiry = now + STATUS_CACHE_TTL
+
+        if not gzipped:
+            return response
+        if gzip_response is None:
+            # Compressed on first demand, then shared until the body changes.
+            body_gzip = gzip.compress(body, compresslevel=6, mtime=0)
+            gzip_response = status_response(body_gzip, etag, True)
+            with self.lock:
+                if self._cached_body is body:
+                    self._cached_gzip_response = gzip_response
+        return gzip_response
+
     def start(self):
         if not self.enabled or self.running:
             return
 
         self.running = True
         with self.lock:
+            if self._start_monotonic is None:
+                self._start_monotonic = time.monotonic()
             if not self.state.get("start_time"):
-                self.state["start_time"] = datetime.now()
-
-        monitor_ref = self
-
-        class MonitorHandler(BaseHTTPRequestHandler):
-            def _send(self, status_code, body, content_type):
-                self.send_response(status_code)
-                self.send_header("Content-Type", content_type)
-                self.send_header("Cache-Control", "no-store")
-                self.send_header("Content-Length", str(len(body)))
-                self.end_headers()
-                self.wfile.write(body)
-
-            def do_GET(self):
-                if self.path in ("/", "/index.html"):
-                    body = MONITOR_TEMPLATE.encode("utf-8")
-                    self._send(200, body, "text/html; charset=utf-8")
-                    return
-
-                if self.path.startswith("/api/status"):
-                    payload = monitor_ref._build_status_payload()
-                    body = json.dumps(payload).encode("utf-8")
-                    self._send(200, body, "application/json; charset=utf-8")
-                    return
-
-                self._send(404, b"Not Found", "text/plain; charset=utf-8")
-
-            def log_message(self, format, *args):
-                return
+                self.state = dict(self.state, start_time=now_timestamp())
 
         def run_server():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
             try:
-                httpd = ThreadingHTTPServer((self.host, self.port), MonitorHandler)
-                httpd.serve_forever()
+                loop.run_until_complete(
+                    asyncio.start_server(self._handle_connection, self.host, self.port)
+                )
+                self._changed = asyncio.Event()
+                self._loop = loop
+                loop.run_forever()
             except Exception as exc:
                 self.log_event(f"Monitoring UI failed to start: {exc}", "ERROR")
                 print(f"[monitor] Failed to start UI: {exc}")
@@ -568,3 +838,65 @@ class DownloadMonitor:
         if host_label in ("0.0.0.0", "127.0.0.1"):
             host_label = "localhost"
         print(f"[monitor] UI available at http://{host_label}:{self.port}")
+
+    async def _handle_connection(self, reader, writer):
+        # asyncio already sets TCP_NODELAY on accepted TCP sockets.
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    return
+
+                lines = head.decode("latin-1").split("\r\n")
+                parts = lines[0].split()
+                if len(parts) != 3:
+                    writer.write(BAD_REQUEST_RESPONSE)
+                    await writer.drain()
+                    return
+
+                method, target, version = parts
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+
+                if method != "GET":
+                    # Any request body is left unread, so the connection can't be reused.
+                    writer.write(METHOD_NOT_ALLOWED_RESPONSE)
+                    await writer.drain()
+                    return
+
+                writer.write(await self._respond(target, headers))
+                await writer.drain()
+
+                connection = headers.get("connection", "").lower()
+                if connection == "close" or (version != "HTTP/1.1" and connection != "keep-alive"):
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, target, headers):
+        """Complete response bytes for one GET request."""
+        if target in ("/", "/index.html"):
+            if accepts_gzip(headers.get("accept-encoding")):
+                return INDEX_GZIP_RESPONSE
+            return INDEX_RESPONSE
+
+        if target.startswith("/api/status"):
+            etag = self.status_etag()
+            client_etag = headers.get("if-none-match")
+            if client_etag == etag:
+                wait = wait_seconds(target)
+                if wait:
+                    await self._wait_for_change(etag, wait)
+                    etag = self.status_etag()
+            if client_etag == etag:
+                return not_modified_response(etag)
+            return self._get_status_response(accepts_gzip(headers.get("accept-encoding")))
+
+        return NOT_FOUND_RESPONSE
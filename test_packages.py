@@ -6,6 +6,12 @@ Tests that all required packages are properly installed and accessible
 
 import sys
 import os
+import importlib
+import importlib.util
+
+# Standard library modules are imported for real: a bad ._pth or a missing
+# .pyd in the embedded install only shows up when their code runs
+STDLIB_MODULES = getattr(sys, 'stdlib_module_names', frozenset())
 
 def test_imports():
     """Test if all required packages can be imported"""
@@ -31,11 +37,22 @@ def test_imports():
     all_ok = True
 
     for module_name, display_name in packages:
+        error = "module not found"
         try:
-            __import__(module_name)
+            if module_name in STDLIB_MODULES:
+                found = importlib.import_module(module_name) is not None
+            else:
+                # Locate the package without running its top-level code; the
+                # real imports are exercised once below
+                found = importlib.util.find_spec(module_name) is not None
+        except (ImportError, ValueError) as e:
+            found = False
+            error = e
+
+        if found:
             print(f"✓ {display_name:<25} - OK")
-        except ImportError as e:
-            print(f"✗ {display_name:<25} - FAILED: {e}")
+        else:
+            print(f"✗ {display_name:<25} - FAILED: {error}")
             all_ok = False
 
     print()
@@ -81,8 +98,12 @@ def check_config():
 
         try:
             import yaml
-            with open(config_file, 'r') as f:
-                config = yaml.safe_load(f)
+            try:
+                from yaml import CSafeLoader as _Loader
+            except ImportError:
+                from yaml import SafeLoader as _Loader
+            with open(config_file, 'rb') as f:
+                config = yaml.load(f, Loader=_Loader)
 
             # Check for required sections
             required_sections = ['settings', 'servers', 'local_ae']